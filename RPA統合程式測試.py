@@ -4,26 +4,33 @@
 import os
 import sys
 import datetime
-import tkinter as tk
-from tkinter import filedialog, messagebox
-import pandas as pd
-from docx import Document
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-
-# 有條件地導入Windows特定模組
-if sys.platform == 'win32':
-    import win32com.client
-    import pythoncom
+import subprocess
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+from instrumentation import span, traced
+
+# 掃描資料夾時的執行緒數（主要在等磁碟 / 網路磁碟 I/O）
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DOCUMENT_RELS_PATH = "word/_rels/document.xml.rels"
+
+@traced("has_images")
 def has_images(doc_path):
-    """檢查Word文件中是否含有圖片"""
+    """檢查Word文件中是否含有圖片
+
+    只從 zip 讀取 word/_rels/document.xml.rels，不建立完整的 python-docx 文件物件
+    """
     try:
-        doc = Document(doc_path)
+        with zipfile.ZipFile(doc_path) as zf:
+            try:
+                rels_xml = zf.read(DOCUMENT_RELS_PATH)
+            except KeyError:
+                return False
 
-        # 檢查是否有圖片
-        for rel in doc.part.rels.values():
-            if "image" in rel.reltype:
+        # 檢查是否有圖片關聯（與 python-docx 的 rel.reltype 判斷相同）
+        for rel in ElementTree.fromstring(rels_xml):
+            if "image" in rel.get("Type", ""):
                 return True
 
         return False
@@ -31,48 +38,52 @@ def has_images(doc_path):
         print(f"處理檔案 {doc_path} 時發生錯誤: {e}")
         return False
 
-def analyze_folder(folder_path):
-    """分析資料夾中的文件，識別問題文件"""
-    # 存儲含有圖片的文件和非Word檔案
-    image_files = []
-    non_word_files = []
-    all_files = []
-    
-    print(f"\n正在分析資料夾: {folder_path}")
-    print("="*50)
-    
-    # 遍歷資料夾中的所有文件
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            all_files.append(file_path)
-            
-            # 使用try-except來處理各種可能的錯誤情況
+def _list_dir(dir_path):
+    """以 os.scandir 列出一個資料夾，回傳 (檔案, 子資料夾)；與 os.walk 相同，不進入符號連結的資料夾"""
+    files, subdirs = [], []
+    with os.scandir(dir_path) as it:
+        for entry in it:
             try:
-                if filename.endswith(".docx") or filename.endswith(".doc"):
-                    if has_images(file_path):
-                        image_files.append(file_path)
-                        print(f"⚠️  {filename} - Word檔含有圖片")
-                else:
-                    if not filename.endswith(".pdf") and not filename.endswith(".txt"):
-                        non_word_files.append(file_path)
-                        print(f"⚠️  {filename} - 非Word檔案格式")
-            except Exception as e:
-                print(f"❌ 處理 {file_path} 時出錯: {e}")
-    
-    # 顯示詳細結果
-    print("\n=== 分析結果摘要 ===")
-    print(f"發現 {len(image_files)} 個含有圖片的Word文件")
-    print(f"發現 {len(non_word_files)} 個非Word/PDF/TXT檔案")
-    
-    return {
-        "image_files": image_files,
-        "non_word_files": non_word_files,
-        "all_files": all_files
-    }
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                files.append(entry.path)
+    return files, subdirs
+
+def _safe_list_dir(dir_path):
+    try:
+        return _list_dir(dir_path)
+    except OSError as e:
+        print(f"❌ 無法讀取資料夾 {dir_path}: {e}")
+        return [], []
+
+def _walk_files(folder_path, executor):
+    """用執行緒池逐層平行列出資料夾，回傳的檔案順序與 os.walk 相同"""
+    listing = {}
+    level = [folder_path]
+    while level:
+        results = list(executor.map(_safe_list_dir, level))
+        listing.update(zip(level, results))
+        level = [d for _, subdirs in results for d in subdirs]
+
+    ordered = []
+    stack = [folder_path]
+    while stack:
+        files, subdirs = listing[stack.pop()]
+        ordered.extend(files)
+        stack.extend(reversed(subdirs))
+    return ordered
 
 def convert_word_to_pdf(word_files, output_folder):
     """將Word文件轉換為PDF"""
+    # Windows特定模組只在實際轉換時才導入
+    import win32com.client
+    import pythoncom
+
     # 創建目標資料夾
     os.makedirs(output_folder, exist_ok=True)
     
@@ -90,36 +101,39 @@ def convert_word_to_pdf(word_files, output_folder):
             pdf_filename = os.path.splitext(filename)[0] + ".pdf"
             pdf_path = os.path.join(output_folder, pdf_filename)
             
-            print(f"正在轉換: {filename} -> {pdf_filename}")
+            with span("convert_word_to_pdf", file=word_path) as s:
+                converted_before = converted_count
+                print(f"正在轉換: {filename} -> {pdf_filename}")
             
-            try:
-                # 初始化COM
-                pythoncom.CoInitialize()
+                try:
+                    # 初始化COM
+                    pythoncom.CoInitialize()
                 
-                # 創建Word應用實例
-                word = win32com.client.Dispatch("Word.Application")
-                word.Visible = False
+                    # 創建Word應用實例
+                    word = win32com.client.Dispatch("Word.Application")
+                    word.Visible = False
                 
-                # 打開Word文件
-                doc = word.Documents.Open(word_path)
+                    # 打開Word文件
+                    doc = word.Documents.Open(word_path)
                 
-                # 保存為PDF
-                doc.SaveAs(pdf_path, FileFormat=17)  # 17代表PDF格式
+                    # 保存為PDF
+                    doc.SaveAs(pdf_path, FileFormat=17)  # 17代表PDF格式
                 
-                # 關閉文件和應用
-                doc.Close()
-                word.Quit()
+                    # 關閉文件和應用
+                    doc.Close()
+                    word.Quit()
                 
-                print(f"✅ 成功轉換: {filename}")
-                converted_count += 1
+                    print(f"✅ 成功轉換: {filename}")
+                    converted_count += 1
                 
-            except Exception as e:
-                print(f"❌ 轉換失敗: {filename}, 錯誤: {e}")
-                error_count += 1
+                except Exception as e:
+                    print(f"❌ 轉換失敗: {filename}, 錯誤: {e}")
+                    error_count += 1
                 
-            finally:
-                # 釋放COM資源
-                pythoncom.CoUninitialize()
+                finally:
+                    # 釋放COM資源
+                    pythoncom.CoUninitialize()
+                s.set(converted=converted_count > converted_before)
     
     # 顯示詳細結果
     print("\n=== 轉換結果摘要 ===")
@@ -161,62 +175,65 @@ def convert_word_to_pdf_macos(word_files, output_folder):
             pdf_filename = os.path.splitext(filename)[0] + ".pdf"
             pdf_path = os.path.join(output_folder, pdf_filename)
             
-            print(f"正在轉換: {filename} -> {pdf_filename}")
+            with span("convert_word_to_pdf_macos", file=word_path) as s:
+                converted_before = converted_count
+                print(f"正在轉換: {filename} -> {pdf_filename}")
             
-            try:
-                # 使用修改後的AppleScript，讓Word有更多時間處理文件
-                script = f"""
-                tell application "Microsoft Word"
-                    activate
-                    delay 2
-                    open "{word_path}"
-                    delay 3
-                    set theDoc to active document
-                    save as theDoc file name "{pdf_path}" file format format PDF
-                    delay 2
-                    close theDoc saving no
-                    delay 1
-                end tell
-                """
+                try:
+                    # 使用修改後的AppleScript，讓Word有更多時間處理文件
+                    script = f"""
+                    tell application "Microsoft Word"
+                        activate
+                        delay 2
+                        open "{word_path}"
+                        delay 3
+                        set theDoc to active document
+                        save as theDoc file name "{pdf_path}" file format format PDF
+                        delay 2
+                        close theDoc saving no
+                        delay 1
+                    end tell
+                    """
                 
-                # 執行AppleScript
-                import subprocess
-                result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
+                    # 執行AppleScript
+                    import subprocess
+                    result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
                 
-                if result.returncode == 0:
-                    print(f"✅ 成功轉換: {filename}")
-                    converted_count += 1
-                else:
-                    print(f"❌ 轉換失敗: {filename}, 錯誤: {result.stderr}")
-                    
-                    # 嘗試替代方法 - 使用automator工作流程或系統PDF列印功能
-                    print(f"   嘗試替代方法...")
-                    try:
-                        # 使用另一種方法
-                        alt_script = f"""
-                        tell application "Microsoft Word"
-                            activate
-                            delay 2
-                            open "{word_path}"
-                            delay 3
-                            set myDoc to active document
-                            set myFilePath to "{pdf_path}"
-                            make new PDF file at active document with properties {{file name:myFilePath}}
-                            delay 2
-                            close active document saving no
-                            delay 1
-                        end tell
-                        """
-                        subprocess.run(["osascript", "-e", alt_script], check=True)
-                        print(f"✅ 使用替代方法成功轉換: {filename}")
+                    if result.returncode == 0:
+                        print(f"✅ 成功轉換: {filename}")
                         converted_count += 1
-                    except Exception as e:
-                        print(f"❌ 替代方法也失敗: {filename}, 錯誤: {e}")
-                        error_count += 1
+                    else:
+                        print(f"❌ 轉換失敗: {filename}, 錯誤: {result.stderr}")
+                    
+                        # 嘗試替代方法 - 使用automator工作流程或系統PDF列印功能
+                        print(f"   嘗試替代方法...")
+                        try:
+                            # 使用另一種方法
+                            alt_script = f"""
+                            tell application "Microsoft Word"
+                                activate
+                                delay 2
+                                open "{word_path}"
+                                delay 3
+                                set myDoc to active document
+                                set myFilePath to "{pdf_path}"
+                                make new PDF file at active document with properties {{file name:myFilePath}}
+                                delay 2
+                                close active document saving no
+                                delay 1
+                            end tell
+                            """
+                            subprocess.run(["osascript", "-e", alt_script], check=True)
+                            print(f"✅ 使用替代方法成功轉換: {filename}")
+                            converted_count += 1
+                        except Exception as e:
+                            print(f"❌ 替代方法也失敗: {filename}, 錯誤: {e}")
+                            error_count += 1
                 
-            except Exception as e:
-                print(f"❌ 轉換失敗: {filename}, 錯誤: {e}")
-                error_count += 1
+                except Exception as e:
+                    print(f"❌ 轉換失敗: {filename}, 錯誤: {e}")
+                    error_count += 1
+                s.set(converted=converted_count > converted_before)
             
             # 每處理5個文件後，嘗試退出並重新啟動Word以釋放內存
             if (converted_count + error_count) % 5 == 0:
@@ -251,113 +268,77 @@ def convert_word_to_pdf_macos(word_files, output_folder):
     
     return converted_count, error_count
 
-def generate_excel_report(image_files, non_word_files):
-    """生成Excel報告"""
-    today = datetime.datetime.now().strftime("%Y%m%d")
-    excel_path = os.path.expanduser(f"~/Documents/會資/Final Project/{today} Doubtful File Name.xlsx") 
-    os.makedirs(os.path.dirname(excel_path), exist_ok=True)
+REPORT_COLUMNS = ["名稱", "疑慮原因", "完成核取方塊"]
+# 各欄的最小寬度；內容較長時依最長的內容加寬
+REPORT_MIN_WIDTHS = {"名稱": 40, "疑慮原因": 30, "完成核取方塊": 20}
 
-    
-    # 創建DataFrame
-    data = []
-    
-    # 添加含有圖片的Word文件
+def problem_rows(image_files, non_word_files):
+    """逐列產生報告內容：(名稱, 疑慮原因, 完成核取方塊)"""
+    # 含有圖片的Word文件
     for file_path in image_files:
-        filename = os.path.basename(file_path)
-        data.append({
-            "名稱": filename,
-            "疑慮原因": "含有圖片",
-            "完成核取方塊": False
-        })
-    
-    # 添加非Word檔案（排除.DS_Store文件）
+        yield os.path.basename(file_path), "含有圖片", False
+
+    # 非Word檔案（排除.DS_Store文件）
     for file_path in non_word_files:
         filename = os.path.basename(file_path)
-        # 跳過.DS_Store文件
         if filename == ".DS_Store":
             continue
-        data.append({
-            "疑慮原因": "疑慮性合約",
-            "名稱": filename,
-            "完成核取方塊": False
-        })
-    
-    # 創建DataFrame
-    if data:
-        df = pd.DataFrame(data)
-        
-        # 交換列順序以符合要求
-        df = df[["名稱", "疑慮原因", "完成核取方塊"]]
-        
-        # 創建Excel工作簿
-        writer = pd.ExcelWriter(excel_path, engine='openpyxl')
-        df.to_excel(writer, index=False, sheet_name='疑慮文件')
-        
-        # 獲取工作表進行格式設置
-        workbook = writer.book
-        worksheet = writer.sheets['疑慮文件']
-        
-        # 設置表頭格式
-        header_font = Font(bold=True, size=12)
-        header_fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        # 設置邊框
-        thin_border = Border(
-            left=Side(style='thin'), 
-            right=Side(style='thin'), 
-            top=Side(style='thin'), 
-            bottom=Side(style='thin')
-        )
-        
-        # 應用表頭格式
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # 應用數據格式
-        for row_idx in range(2, len(df) + 2):
-            for col_idx in range(1, 4):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                cell.border = thin_border
-                if col_idx == 3:  # 完成核取方塊列
-                    cell.alignment = Alignment(horizontal='center')
-        
-        # 調整列寬 - 讓所有列都有足夠寬度
-        for col_idx, column in enumerate(df.columns, 1):
-            # 針對特定列設置最小寬度
-            if column == "名稱":
-                min_width = 40  # 設置名稱列的最小寬度
-            elif column == "疑慮原因":
-                min_width = 30  # 設置疑慮原因列的最小寬度
-            elif column == "完成核取方塊":
-                min_width = 20  # 設置完成核取方塊列的最小寬度
-            else:
-                min_width = 15  # 其他列的最小寬度
-            
-            # 計算實際需要的寬度（基於內容長度）
-            content_width = max(len(column) * 1.2, df[column].astype(str).map(len).max() * 1.2)
-            
-            # 使用兩者中較大的值
-            column_width = max(min_width, content_width)
-            
-            # 設置列寬
-            worksheet.column_dimensions[get_column_letter(col_idx)].width = column_width
-        
-        # 保存Excel文件
-        writer.close()
-        
+        yield filename, "疑慮性合約", False
+
+def generate_excel_report(image_files, non_word_files):
+    """生成Excel報告
+
+    以 write_only 模式逐列寫出，不建立 DataFrame，問題文件再多記憶體用量也不會增加
+    """
+    from excel_report import write_report
+    today = datetime.datetime.now().strftime("%Y%m%d")
+    excel_path = os.path.expanduser(f"~/Documents/會資/Final Project/{today} Doubtful File Name.xlsx") 
+    os.makedirs(os.path.dirname(excel_path), exist_ok=True)
+
+    count = write_report(excel_path, '疑慮文件', REPORT_COLUMNS,
+                         lambda: problem_rows(image_files, non_word_files),
+                         min_widths=REPORT_MIN_WIDTHS, centered=("完成核取方塊",))
+    if count:
         print(f"\n報告已生成: {excel_path}")
-        return excel_path, len(data)
+        return excel_path, count
     else:
         print("\n沒有發現問題文件，無需生成報告")
         return None, 0
 
-def analyze_folder(folder_path):
-    """分析資料夾中的文件，識別問題文件"""
+def _check_images(file_path, manifest=None):
+    """has_images 加上執行清單：大小與修改時間沒變時沿用上次的掃描結果
+
+    只讀 rels 的掃描比計算整個檔案的 SHA-256 還快，所以以大小與修改時間判斷，不計算內容雜湊
+    """
+    if manifest is None:
+        return has_images(file_path)
+    try:
+        fingerprint = manifest.file_signature(file_path)
+    except OSError:
+        return has_images(file_path)
+    cached = manifest.get(file_path, "scan", fingerprint)
+    if cached is not None:
+        return cached == "1"
+    result = has_images(file_path)
+    manifest.mark_done(file_path, "scan", fingerprint, output="1" if result else "0")
+    return result
+
+def problem_reason(file_path, manifest=None):
+    """回傳檔案在疑慮文件報告中的疑慮原因（"含有圖片"、"疑慮性合約"），沒有問題時回傳 None
+
+    批次模式（analyze_folder）與常駐模式（watch_folder.py）共用同一套判斷
+    """
+    filename = os.path.basename(file_path)
+    if filename == ".DS_Store":
+        return None
+    if filename.endswith(".docx") or filename.endswith(".doc"):
+        return "含有圖片" if _check_images(file_path, manifest) else None
+    if filename.endswith(".pdf") or filename.endswith(".txt"):
+        return None
+    return "疑慮性合約"
+
+def analyze_folder(folder_path, manifest=None):
+    """分析資料夾中的文件，識別問題文件；manifest 為 run_manifest.RunManifest"""
     # 存儲含有圖片的文件和非Word檔案
     image_files = []
     non_word_files = []
@@ -366,28 +347,21 @@ def analyze_folder(folder_path):
     print(f"\n正在分析資料夾: {folder_path}")
     print("="*50)
     
-    # 遍歷資料夾中的所有文件
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            # 跳過.DS_Store文件
-            if filename == ".DS_Store":
-                continue
-                
-            file_path = os.path.join(root, filename)
-            all_files.append(file_path)
-            
-            # 使用try-except來處理各種可能的錯誤情況
-            try:
-                if filename.endswith(".docx") or filename.endswith(".doc"):
-                    if has_images(file_path):
-                        image_files.append(file_path)
-                        print(f"⚠️  {filename} - Word檔含有圖片")
-                else:
-                    if not filename.endswith(".pdf") and not filename.endswith(".txt"):
-                        non_word_files.append(file_path)
-                        print(f"⚠️  {filename} - 非Word檔案格式")
-            except Exception as e:
-                print(f"❌ 處理 {file_path} 時出錯: {e}")
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        # 遍歷資料夾中的所有文件（跳過.DS_Store文件）
+        all_files = [f for f in _walk_files(folder_path, executor)
+                     if os.path.basename(f) != ".DS_Store"]
+        # 平行檢查 Word 檔是否含有圖片
+        reasons = list(executor.map(lambda f: problem_reason(f, manifest), all_files))
+    
+    for file_path, reason in zip(all_files, reasons):
+        filename = os.path.basename(file_path)
+        if reason == "含有圖片":
+            image_files.append(file_path)
+            print(f"⚠️  {filename} - Word檔含有圖片")
+        elif reason is not None:
+            non_word_files.append(file_path)
+            print(f"⚠️  {filename} - 非Word檔案格式")
     
     # 顯示詳細結果
     print("\n=== 分析結果摘要 ===")
@@ -400,8 +374,49 @@ def analyze_folder(folder_path):
         "all_files": all_files
     }
 
+def word_conversion_available():
+    """Word → PDF 轉換需要 Word：Windows 透過 COM，macOS 透過 AppleScript"""
+    return sys.platform == 'win32' or sys.platform == 'darwin'
+
+def convert_word_files(word_files, output_folder, manifest=None):
+    """依作業系統選擇 Word → PDF 的轉換方式；有 manifest 時略過 PDF 已是最新的檔案"""
+    pending = []
+    if manifest is not None:
+        for word_path in word_files:
+            pdf_path = os.path.join(output_folder, os.path.splitext(os.path.basename(word_path))[0] + ".pdf")
+            try:
+                fingerprint = manifest.file_hash(word_path)
+            except OSError as e:
+                # 檔案被鎖住或剛被移走：無法判斷是否已轉換，照常交給轉換程式處理，但不記錄為完成
+                print(f"⚠️  無法讀取 {os.path.basename(word_path)}：{e}")
+                pending.append((word_path, None, pdf_path))
+                continue
+            if not manifest.is_done(word_path, "pdf", fingerprint):
+                pending.append((word_path, fingerprint, pdf_path))
+        skipped = len(word_files) - len(pending)
+        if skipped:
+            print(f"\n⏭️  {skipped} 個Word文件的PDF已是最新，略過轉換")
+        word_files = [word_path for word_path, _, _ in pending]
+        if not word_files:
+            return 0, 0
+
+    started = datetime.datetime.now().timestamp()
+    if sys.platform == 'win32':
+        result = convert_word_to_pdf(word_files, output_folder)
+    else:
+        result = convert_word_to_pdf_macos(word_files, output_folder)
+
+    # 只有這次真的產生（或更新）了 PDF 才記錄為完成
+    for word_path, fingerprint, pdf_path in pending:
+        if fingerprint is not None and os.path.exists(pdf_path) and os.path.getmtime(pdf_path) >= started:
+            manifest.mark_done(word_path, "pdf", fingerprint, output_path=pdf_path)
+    return result
+
 def select_folder_with_gui():
     """使用對話框選擇資料夾"""
+    # tkinter 只在需要對話框時才載入，沒有圖形介面的伺服器（watch_folder.py）也能匯入這個模組
+    import tkinter as tk
+    from tkinter import filedialog
     root = tk.Tk()
     root.withdraw()  # 隱藏主窗口
     
@@ -415,6 +430,8 @@ def select_folder_with_gui():
 
 def show_completion_message(analysis_result, excel_path, pdf_folder, problematic_count):
     """顯示完成信息對話框"""
+    import tkinter as tk
+    from tkinter import messagebox
     root = tk.Tk()
     root.withdraw()  # 隱藏主窗口
     
@@ -434,31 +451,49 @@ def show_completion_message(analysis_result, excel_path, pdf_folder, problematic
     
     messagebox.showinfo("處理完成", message)
 
-def main():
+def main(direct_docx=False, archive_pdf=True, manifest=None):
+    """direct_docx 為 True 時 .docx 不先轉 PDF（由 process_all 直接讀取），
+    只有 .doc 需要同步轉換；archive_pdf 為 True 時 .docx 另外在背景轉成 PDF 封存。
+    manifest 為 run_manifest.RunManifest，內容沒變的檔案會略過掃描與轉換。
+
+    回傳 {"folder", "analysis", "archive_thread"}，archive_thread 為背景封存執行緒或 None
+    """
     print("文件處理整合工具 v1.0")
     print("="*50)
     print("此工具將分析資料夾中的文件，識別問題文件，轉換Word為PDF，並生成Excel報告")
     
+    archive_thread = None
     try:
         # 選擇資料夾
         folder_path = select_folder_with_gui()
         
         # 1. 分析資料夾中的文件
-        analysis_result = analyze_folder(folder_path)
+        analysis_result = analyze_folder(folder_path, manifest=manifest)
         
         word_files = [f for f in analysis_result["all_files"] if f.endswith(".docx") or f.endswith(".doc")]
         image_files = analysis_result["image_files"]
         non_word_files = analysis_result["non_word_files"]
         
         # 2. 將Word文件轉換為PDF
-        today = datetime.datetime.now().strftime("%Y%m%d")
         pdf_folder = os.path.expanduser(f"~/Documents/會資/Final Project/PDF_2")
 
-        if word_files:
-            if sys.platform == 'win32':
-                convert_word_to_pdf(word_files, pdf_folder)
+        if direct_docx:
+            # .docx 可直接擷取文字，只有舊格式 .doc 需要先轉成 PDF
+            doc_files = [f for f in word_files if f.endswith(".doc")]
+            docx_files = [f for f in word_files if f.endswith(".docx")]
+            if not word_conversion_available():
+                if doc_files:
+                    print(f"\n⚠️ 此系統沒有 Word，無法轉換 {len(doc_files)} 個 .doc 檔案")
             else:
-                convert_word_to_pdf_macos(word_files, pdf_folder)
+                if doc_files:
+                    convert_word_files(doc_files, pdf_folder, manifest=manifest)
+                if docx_files and archive_pdf:
+                    print(f"\n📦 在背景將 {len(docx_files)} 個 .docx 轉為 PDF 封存")
+                    archive_thread = threading.Thread(
+                        target=convert_word_files, args=(docx_files, pdf_folder, manifest), name="pdf-archive")
+                    archive_thread.start()
+        elif word_files:
+            convert_word_files(word_files, pdf_folder, manifest=manifest)
         else:
             print("\n未發現Word文件，跳過PDF轉換步驟")
         
@@ -474,9 +509,11 @@ def main():
         show_completion_message(analysis_result, excel_path, pdf_folder, problematic_count)
         
         print("\n程式執行完畢！")
+        return {"folder": folder_path, "analysis": analysis_result, "archive_thread": archive_thread}
     
     except Exception as e:
         print(f"程式執行過程中發生錯誤: {e}")
+        from tkinter import messagebox
         messagebox.showerror("錯誤", f"程式執行過程中發生錯誤:\n{e}")
         raise
 
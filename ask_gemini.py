@@ -1,22 +1,43 @@
 # ask_gemini.py
 import os
 import sys
-import google.generativeai as genai
-import pandas as pd
 import re
+import json
+import threading
+from rate_limiter import estimate_tokens
+from response_cache import make_key as make_cache_key
+from findings_store import FindingsStore, REPORT_PATH
+from instrumentation import span, traced
+MODEL_NAME = "gemini-1.5-flash"
+GENERATION_CONFIG = {}  # 傳給 GenerativeModel 的生成設定，也是回應快取鍵的一部分
+API_KEY_PATH = "Gemini_API_key.txt"
 
-REPORT_PATH = "file_report.xlsx"
+_genai = None
+_genai_lock = threading.Lock()
 
-def load_api_key(filepath="Gemini_API_key.txt"):
+def load_api_key(filepath=API_KEY_PATH):
     try:
         with open(filepath, "r", encoding="utf-8") as f:
             return f.read().strip()
     except FileNotFoundError:
+        raise RuntimeError(f"找不到 API 金鑰檔案：{filepath}") from None
+
+def require_api_key(filepath=API_KEY_PATH):
+    """命令列程式開始處理前先確認金鑰檔案存在，不必等到第一次呼叫 Gemini 才失敗"""
+    if not os.path.exists(filepath):
         print(f"❌ 找不到 API 金鑰檔案：{filepath}")
         sys.exit(1)
 
-api_key = load_api_key()
-genai.configure(api_key=api_key)
+def get_genai():
+    """第一次建立模型時才載入 google.generativeai 並設定金鑰；匯入這個模組沒有副作用，
+    只用快取或假模型時也不需要金鑰"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=load_api_key())
+            _genai = genai
+    return _genai
 
 PROMPT_TEMPLATE = """
 请从以下文件中分析以下信息，并输出分析结果的纯文本，只需输出分析结果，且不需要格式化。
@@ -52,12 +73,176 @@ PROMPT_TEMPLATE = """
 例如：“合同中的产品全部发货后九十（90）天，甲方向乙方支付全部合同款项”，此例明确说明发货后90天内付款，因此具有明确的款项回收时间，为闭口合同。
 """
 
-def ask_gemini(text: str):
-    prompt = PROMPT_TEMPLATE.format(text=text)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content(prompt)
+# PROMPT_TEMPLATE 中的六個問題（題號 → 題目），只問部分問題時用來組出較短的提示詞
+QUESTIONS = {int(n): q for n, q in re.findall(r"^(\d)\. (.+：)$", PROMPT_TEMPLATE, re.M)[:6]}
+ANSWER_LINE = re.compile(r"^\s*(\d)\s*[\.、．]\s*(.*)$")
+
+def build_template(fields=None):
+    """fields 為要問的題號；None 表示全部問題，即 PROMPT_TEMPLATE 本身"""
+    if fields is None:
+        return PROMPT_TEMPLATE
+    all_questions = "\n".join(f"{n}. {q}" for n, q in QUESTIONS.items())
+    subset = "\n".join(f"{n}. {QUESTIONS[n]}" for n in sorted(fields))
+    return PROMPT_TEMPLATE.replace(all_questions, subset, 1)
+
+def parse_answers(result_text: str) -> dict:
+    """把「1. 需方：…」格式的回應拆成 {題號: 該題的內容（含題目）}"""
+    answers = {}
+    current = None
+    for line in result_text.splitlines():
+        match = ANSWER_LINE.match(line)
+        if match and int(match.group(1)) in QUESTIONS:
+            current = int(match.group(1))
+            answers[current] = match.group(2).strip()
+        elif current is not None and line.strip():
+            answers[current] += "\n" + line.strip()
+    return answers
+
+def format_answers(answers: dict) -> str:
+    """依題號順序組回與 Gemini 相同格式的分析結果；缺少的題目視為未明确提及"""
+    return "\n".join(f"{n}. {answers.get(n, QUESTIONS[n] + '未明确提及')}" for n in QUESTIONS)
+
+def _prepare_request(text, model, cache, fields):
+    """回傳 (模型, 提示詞, 快取鍵, 快取的回應)；沒有快取或未命中時快取的回應為 None"""
+    template = build_template(fields)
+    prompt = template.format(text=text)
+    if model is None:
+        model = get_genai().GenerativeModel(MODEL_NAME, generation_config=GENERATION_CONFIG or None)
+    model_name = getattr(model, "model_name", MODEL_NAME)
+    key = cached = None
+    if cache is not None:
+        key = make_cache_key(template, model_name, GENERATION_CONFIG, text)
+        cached = cache.get(key)
+    return model, prompt, (key, model_name, template), cached
+
+def ask_gemini(text: str, model=None, limiter=None, cache=None, fields=None):
+    """model 可傳入假模型做測試；limiter 為 rate_limiter.RateLimiter，會依配額限流並在 429 時重試；
+    cache 為 response_cache.ResponseCache，相同模板 / 模型 / 設定 / 文字直接回傳上次的回應；
+    fields 為只要問的題號（例如本機規則解不出的欄位），None 表示六題全問"""
+    with span("ask_gemini") as s:
+        model, prompt, cache_entry, cached = _prepare_request(text, model, cache, fields)
+        s.set(prompt_tokens=estimate_tokens(prompt), cached=cached is not None)
+        if cached is not None:
+            return cached
+
+        if limiter is not None:
+            response = limiter.call(model.generate_content, prompt, tokens=estimate_tokens(prompt))
+        else:
+            response = model.generate_content(prompt)
+        s.set(response_tokens=estimate_tokens(response.text))
+
+    if cache is not None:
+        cache.put(*cache_entry, response.text)
     return response.text
 
+async def ask_gemini_async(text: str, model=None, limiter=None, cache=None, fields=None):
+    """ask_gemini 的非同步版本，以 generate_content_async 呼叫模型；參數意義相同"""
+    with span("ask_gemini") as s:
+        model, prompt, cache_entry, cached = _prepare_request(text, model, cache, fields)
+        s.set(prompt_tokens=estimate_tokens(prompt), cached=cached is not None)
+        if cached is not None:
+            return cached
+
+        if limiter is not None:
+            response = await limiter.call_async(model.generate_content_async, prompt,
+                                                tokens=estimate_tokens(prompt))
+        else:
+            response = await model.generate_content_async(prompt)
+        s.set(response_tokens=estimate_tokens(response.text))
+
+    if cache is not None:
+        cache.put(*cache_entry, response.text)
+    return response.text
+
+# 批次模式：多份短文件放進同一個請求，要求以 JSON 陣列回傳每份文件的分析結果
+BATCH_TOKEN_BUDGET = 24000   # 每個批次請求中文件內容的 token 上限
+BATCH_MAX_DOCS = 8           # 每個批次最多幾份文件
+BATCH_DOC_MAX_TOKENS = 4000  # 超過此長度的文件不併入批次，單獨分析
+BATCH_GENERATION_CONFIG = {**GENERATION_CONFIG, "response_mime_type": "application/json"}
+_DOCUMENT_BLOCK = '文件内容如下：\n"""\n{text}\n"""\n'
+BATCH_PROMPT_TEMPLATE = (
+    PROMPT_TEMPLATE
+    .replace("请从以下文件中分析以下信息，并输出分析结果的纯文本，只需输出分析结果，且不需要格式化。",
+             "以下有多份文件，请分别对每一份文件分析以下信息。")
+    .replace(_DOCUMENT_BLOCK, "")
+    + """
+请只输出一个 JSON 数组，每份文件对应一个对象，不要输出其他文字：
+[{"id": "文件编号", "result": "1. 需方：…\n2. …\n3. …\n4. …\n5. …\n6. …"}]
+其中 result 为该文件六个问题的分析结果纯文本，格式与单份文件分析时相同。
+
+各文件内容如下：
+"""
+)
+
+def pack_batches(items, token_budget=BATCH_TOKEN_BUDGET, max_docs=BATCH_MAX_DOCS):
+    """把 [(鍵, 文字)] 依 token 上限與文件數依序分組，回傳多個批次的清單"""
+    batches, current, used = [], [], 0
+    for doc_id, text in items:
+        tokens = estimate_tokens(text)
+        if current and (used + tokens > token_budget or len(current) >= max_docs):
+            batches.append(current)
+            current, used = [], 0
+        current.append((doc_id, text))
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_documents(docs: dict) -> str:
+    return "".join(f'\n=== 文件编号：{doc_id} ===\n"""\n{text}\n"""\n' for doc_id, text in docs.items())
+
+def parse_batch_response(response_text: str, doc_ids) -> dict:
+    """解析 JSON 陣列回應，回傳 {文件編號: 分析結果}；缺少或格式錯誤的文件不會出現在結果中"""
+    start, end = response_text.find("["), response_text.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(response_text[start:end + 1])
+    except ValueError:
+        return {}
+    results = {}
+    wanted = {str(doc_id) for doc_id in doc_ids}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or str(item.get("id")) not in wanted:
+            continue
+        result = item.get("result")
+        if isinstance(result, list):
+            result = "\n".join(str(line) for line in result)
+        # 至少要能解析出題號格式的答案，否則視為格式錯誤
+        if isinstance(result, str) and parse_answers(result):
+            results[str(item["id"])] = result
+    return results
+
+def ask_gemini_batch(docs: dict, model=None, limiter=None, cache=None) -> dict:
+    """docs 為 {文件編號: 文字}，一次請求分析多份文件；回傳 {文件編號: 分析結果}
+
+    缺少或格式錯誤的文件不會出現在結果中，由呼叫端改為單獨分析
+    """
+    documents = build_batch_documents(docs)
+    prompt = BATCH_PROMPT_TEMPLATE + documents
+    if model is None:
+        model = get_genai().GenerativeModel(MODEL_NAME, generation_config=BATCH_GENERATION_CONFIG)
+    model_name = getattr(model, "model_name", MODEL_NAME)
+
+    if cache is not None:
+        key = make_cache_key(BATCH_PROMPT_TEMPLATE, model_name, BATCH_GENERATION_CONFIG, documents)
+        cached = cache.get(key)
+        if cached is not None:
+            return parse_batch_response(cached, docs)
+
+    with span("ask_gemini_batch", documents=len(docs), prompt_tokens=estimate_tokens(prompt)) as s:
+        if limiter is not None:
+            response = limiter.call(model.generate_content, prompt, tokens=estimate_tokens(prompt))
+        else:
+            response = model.generate_content(prompt)
+        s.set(response_tokens=estimate_tokens(response.text))
+
+    results = parse_batch_response(response.text, docs)
+    # 只有每份文件都有結果時才快取，避免把不完整的回應一直重複使用
+    if cache is not None and len(results) == len(docs):
+        cache.put(key, model_name, BATCH_PROMPT_TEMPLATE, response.text)
+    return results
+
 def is_suspicious(response_text: str) -> bool:
     lowered = response_text.lower()
     return (
@@ -94,20 +279,18 @@ def extract_suspicious_part(result_text: str) -> str:
         return "\n\n".join(suspicious_fields)
     return "未找到疑慮段落"
 
-def log_suspicious(filename: str, analysis: str):
+@traced("log_suspicious")
+def log_suspicious(filename: str, analysis: str, store=None):
+    """把疑慮摘要附加到 findings_store；Excel 報告在整批結束時由 FindingsStore.export_excel 產生"""
     summary = extract_suspicious_part(analysis)
-    new_row = {
-        "檔案名稱": filename,
-        "疑慮摘要": summary
-    }
-
-    if os.path.exists(REPORT_PATH):
-        df_existing = pd.read_excel(REPORT_PATH)
-        df_updated = pd.concat([df_existing, pd.DataFrame([new_row])], ignore_index=True)
-    else:
-        df_updated = pd.DataFrame([new_row])
-
-    df_updated.to_excel(REPORT_PATH, index=False)
+    if store is not None:
+        store.append(filename, summary)
+        return
+    store = FindingsStore()
+    try:
+        store.append(filename, summary)
+    finally:
+        store.close()
 
 
 if __name__ == '__main__':
@@ -115,6 +298,7 @@ if __name__ == '__main__':
         print("用法：python ask_gemini.py <txt檔案路徑>")
         sys.exit(1)
 
+    require_api_key()
     txt_path = sys.argv[1]
     with open(txt_path, 'r', encoding='utf-8') as f:
         content = f.read()
@@ -129,7 +313,10 @@ if __name__ == '__main__':
     if is_suspicious(result):
         print(f"⚠️ 有疑慮，記錄到 {REPORT_PATH}")
         suspicious_summary = extract_suspicious_part(result)
-        log_suspicious(os.path.basename(txt_path), suspicious_summary)
+        store = FindingsStore()
+        log_suspicious(os.path.basename(txt_path), suspicious_summary, store=store)
+        store.export_excel(REPORT_PATH)
+        store.close()
 
 
     print(result)
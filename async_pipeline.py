@@ -0,0 +1,161 @@
+# async_pipeline.py
+# 以 asyncio 串起四個階段：掃描 → 擷取 / OCR（行程池）→ Gemini 分析（generate_content_async）→ 寫出結果與報告
+# 階段之間以有上限的佇列連接，下游跟不上時上游會自動等待；總耗時接近最慢的那個階段，而不是各階段相加
+import os
+import time
+import asyncio
+
+from read_doc import create_extract_pool
+from instrumentation import span
+from ask_gemini import ask_gemini_async
+from process_all import (BatchContext, load_or_extract, new_record, plan_analysis, remember_analysis,
+                         merge_answers, write_result, report_file)
+
+DEFAULT_EXTRACT_WORKERS = os.cpu_count() or 1
+DEFAULT_ANALYZE_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 8
+STAGE_NAMES = {"extract": "擷取", "analyze": "分析", "write": "寫出"}
+
+
+def load_result(record, ctx):
+    """分析結果已是最新時讀回 RESULT，否則回傳 None"""
+    manifest = ctx.manifest
+    if manifest is None or not manifest.is_done(record["path"], "result", record["fingerprints"]["result"]):
+        return None
+    with open(os.path.join(ctx.result_dir, record["txt"]), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+async def analyze_text(record, text, ctx):
+    """與 process_all.analyze_file 相同的分析步驟，但以非同步方式呼叫 Gemini；回傳分析結果
+
+    執行清單、相似度索引（SQLite）與本機規則都是同步的，放到執行緒中執行，不佔住事件迴圈
+    """
+    txt_filename = record["txt"]
+    result = await asyncio.to_thread(load_result, record, ctx)
+    if result is not None:
+        # 分析結果已是最新，只差報告這一步
+        return result, False
+
+    print(f"🤖 Analyzing: {txt_filename}")
+    with span("analyze", file=record["file"]):
+        plan = await asyncio.to_thread(plan_analysis, text, ctx, txt_filename)
+        result = plan.result
+        if result is None:
+            result = await ask_gemini_async(plan.text, model=ctx.model, limiter=ctx.limiter,
+                                            cache=ctx.response_cache, fields=plan.fields)
+            result = merge_answers(result, plan.resolved)
+    await asyncio.to_thread(remember_analysis, text, result, plan, ctx, txt_filename)
+    return result, True
+
+
+class Pipeline:
+    """一次處理一批檔案；每個階段各自的並行數由建構參數決定"""
+
+    def __init__(self, ctx, extract_workers=DEFAULT_EXTRACT_WORKERS,
+                 analyze_workers=DEFAULT_ANALYZE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.ctx = ctx
+        self.extract_workers = extract_workers
+        self.analyze_workers = analyze_workers
+        self.queue_size = queue_size
+        self.busy = {stage: 0.0 for stage in STAGE_NAMES}
+        self.records = []
+
+    async def _scan(self, file_paths, out):
+        for index, file_path in enumerate(file_paths):
+            await out.put((index, file_path))
+        for _ in range(self.extract_workers):
+            await out.put(None)
+
+    async def _extract(self, inp, out, pool):
+        while (item := await inp.get()) is not None:
+            index, file_path = item
+            started = time.monotonic()
+            # 執行清單與快取的查詢在執行緒中進行，實際擷取 / OCR 再交給行程池
+            try:
+                record, text = await asyncio.to_thread(load_or_extract, file_path, self.ctx, pool)
+            except Exception as e:
+                # 單一檔案失敗只記錄下來，繼續處理佇列中的其他檔案
+                print(f"❌ 讀取檔案失敗：{os.path.basename(file_path)}，錯誤：{e}")
+                record, text = new_record(file_path), None
+                record.update(status="extract_failed", error=str(e))
+            self.busy["extract"] += time.monotonic() - started
+            if text is None:
+                self.records.append((index, record))
+            else:
+                await out.put((index, record, text))
+
+    async def _analyze(self, inp, out):
+        while (item := await inp.get()) is not None:
+            index, record, text = item
+            started = time.monotonic()
+            try:
+                result, is_new = await analyze_text(record, text, self.ctx)
+            except Exception as e:
+                print(f"❌ Gemini 分析失敗：{record['txt']}，錯誤：{e}")
+                record.update(status="analyze_failed", error=str(e))
+                result, is_new = None, False
+            self.busy["analyze"] += time.monotonic() - started
+            await out.put((index, record, result, is_new))
+
+    async def _write(self, inp):
+        while (item := await inp.get()) is not None:
+            index, record, result, is_new = item
+            started = time.monotonic()
+            if result is not None:
+                if is_new:
+                    write_result(record, result, self.ctx)
+                report_file(record, result, self.ctx)
+            self.busy["write"] += time.monotonic() - started
+            self.records.append((index, record))
+
+    async def run(self, file_paths):
+        """處理所有檔案，回傳與輸入順序相同的處理紀錄"""
+        self.ctx.make_output_dirs()
+        paths = asyncio.Queue(maxsize=self.queue_size)
+        texts = asyncio.Queue(maxsize=self.queue_size)
+        results = asyncio.Queue(maxsize=self.queue_size)
+        started = time.monotonic()
+
+        pool = create_extract_pool(self.extract_workers)
+        try:
+            scan = asyncio.create_task(self._scan(file_paths, paths))
+            extractors = [asyncio.create_task(self._extract(paths, texts, pool))
+                          for _ in range(self.extract_workers)]
+            analyzers = [asyncio.create_task(self._analyze(texts, results))
+                         for _ in range(self.analyze_workers)]
+            writer = asyncio.create_task(self._write(results))
+
+            await scan
+            await asyncio.gather(*extractors)
+            for _ in analyzers:
+                await texts.put(None)
+            await asyncio.gather(*analyzers)
+            await results.put(None)
+            await writer
+        finally:
+            pool.shutdown()
+
+        self.elapsed = time.monotonic() - started
+        return [record for _, record in sorted(self.records, key=lambda item: item[0])]
+
+    def print_summary(self):
+        print("\n=== 管線各階段耗時 ===")
+        workers = {"extract": self.extract_workers, "analyze": self.analyze_workers, "write": 1}
+        for stage, name in STAGE_NAMES.items():
+            # 累計忙碌時間 ÷ 並行數 ≈ 此階段單獨執行所需的時間
+            print(f"{name}：累計 {self.busy[stage]:.1f} 秒，並行 {workers[stage]}，"
+                  f"約 {self.busy[stage] / workers[stage]:.1f} 秒")
+        print(f"總耗時 {self.elapsed:.1f} 秒")
+
+
+def run_pipeline(file_paths, ctx=None, extract_workers=DEFAULT_EXTRACT_WORKERS,
+                 analyze_workers=DEFAULT_ANALYZE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+    """process_all.process_files 的管線版本，回傳處理紀錄"""
+    ctx = ctx if ctx is not None else BatchContext()
+    pipeline = Pipeline(ctx, extract_workers=extract_workers, analyze_workers=analyze_workers,
+                        queue_size=queue_size)
+    records = asyncio.run(pipeline.run(file_paths))
+    ctx.print_summary()
+    pipeline.print_summary()
+    return records
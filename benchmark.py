@@ -0,0 +1,547 @@
+# benchmark.py
+# 以專案本身用到的函式庫產生一批合成合約（有 / 無圖片的 DOCX、文字層 PDF、純影像掃描 PDF、混合 PDF），
+# 依序量測 analyze_folder、read_text_from_file、ask_gemini（假模型）與 generate_excel_report，
+# 以及 Word 擷取方式的比較與各命令列程式的啟動時間，把各階段的吞吐量、p50 / p95 延遲與記憶體峰值寫成 JSON，方便比較改動前後的效能
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+import datetime
+import platform
+import contextlib
+
+DEFAULT_CORPUS_DIR = "benchmark_corpus"
+DEFAULT_RESULTS_DIR = "benchmark_results"
+KINDS = ("docx", "docx_images", "text_pdf", "scanned_pdf", "mixed_pdf")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 啟動時間：在全新的 Python 行程中匯入各入口模組、執行各命令列程式的 --help
+ENTRY_POINTS = ("process_all", "async_pipeline", "job_queue", "watch_folder", "ask_gemini", "read_doc",
+                "RPA統合程式測試", "findings_store", "similarity_index")
+HELP_SCRIPTS = ("process_all.py", "job_queue.py", "watch_folder.py", "similarity_index.py", "findings_store.py")
+# 只有實際用到時才該載入的套件；匯入入口模組後出現在 sys.modules 中，表示又有模組在最上層匯入了它
+HEAVY_MODULES = ("google.generativeai", "pandas", "openpyxl", "docx", "PyPDF2", "pdf2image", "pytesseract",
+                 "tesserocr", "tkinter", "numpy", "PIL", "win32com")
+STARTUP_REPEATS = 5
+
+# Word 擷取方式比較用的大文件：多份合約接在一起，每份附一個金額 / 帳戶表格；與合成合約一樣放在 --corpus-dir 中
+LARGE_DOCX_NAME = "large_contracts.docx"
+LARGE_DOCX_CONTRACTS = 300
+LARGE_DOCX_REPEATS = 3
+# 子行程的 ru_maxrss 在 Linux 上會沿用 fork 時父行程的峰值，有 /proc 時改讀 VmHWM（exec 後重新計算，單位 KB）
+_DOCX_PROBE = """
+import re, sys, resource, docx, lxml.etree, read_doc
+
+def peak_kb():
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\\s*(\\d+)", f.read()).group(1))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1)
+
+read_doc.DOCX_EXTRACTOR = sys.argv[1]
+before = peak_kb()
+read_doc.read_docx(sys.argv[2])
+print(before, peak_kb())
+"""
+_IMPORT_PROBE = ("import importlib, json, sys; importlib.import_module(sys.argv[1]); "
+                 "print(json.dumps([m for m in sys.argv[2:] if m in sys.modules]))")
+
+BUYERS = ["华东精密机械有限公司", "北方能源科技有限公司", "南海电子设备厂", "西部数据服务中心", "东方建设集团有限公司"]
+SELLERS = ["恒信工业自动化有限公司", "远航物流有限公司", "金桥软件技术有限公司", "瑞丰材料有限公司"]
+PAYMENT_METHODS = ["电汇", "银行承兑汇票", "电汇或银行承兑汇票"]
+BOILERPLATE = [
+    "双方本着平等互利的原则，经友好协商，就下列事项达成一致，共同遵守。",
+    "供方应保证所提供的产品符合国家标准及行业标准，并提供产品合格证明。",
+    "如因不可抗力导致合同无法履行，双方互不承担违约责任，但应及时通知对方。",
+    "本合同未尽事宜，由双方另行协商并签订补充协议，补充协议与本合同具有同等法律效力。",
+    "因本合同引起的争议，双方应协商解决；协商不成的，提交需方所在地人民法院诉讼解决。",
+    "本合同一式两份，双方各执一份，自双方签字盖章之日起生效。",
+]
+
+
+def contract_lines(rng, index):
+    """產生一份中文合約範本的文字行，金額、公司與付款條件依亂數變化"""
+    taxed = rng.randrange(10, 500) * 1130
+    untaxed = taxed / 1.13
+    lines = [
+        f"采购合同（编号：HT-{2024000 + index}）",
+        f"需方：{rng.choice(BUYERS)}",
+        f"供方：{rng.choice(SELLERS)}",
+        f"合同总额（含税）：人民币{taxed:,.2f}元，不含税金额{untaxed:,.2f}元，税率13%。",
+        f"付款方式：{rng.choice(PAYMENT_METHODS)}。",
+        f"需方收到货物并验收合格后{rng.choice([30, 45, 60, 90])}日内支付全部货款。",
+        "供方应于货物验收合格后开具增值税专用发票。",
+        f"需方开户银行：中国工商银行，账号：{rng.randrange(10 ** 15, 10 ** 16)}",
+    ]
+    for _ in range(rng.randrange(15, 40)):
+        lines.append(rng.choice(BOILERPLATE))
+    return lines
+
+
+def paginate(lines, per_page=40):
+    return [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+
+
+def write_docx(path, lines, image=None):
+    from docx import Document
+    from docx.shared import Inches
+    doc = Document()
+    for line in lines:
+        doc.add_paragraph(line)
+    if image is not None:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        buffer.seek(0)
+        doc.add_picture(buffer, width=Inches(2))
+    doc.save(path)
+
+
+def write_text_pdf(path, pages):
+    """寫出只有文字層的 PDF：Identity-H 編碼加上 ToUnicode 對照表，PyPDF2 可正確擷取中文"""
+    chars = sorted({ch for lines in pages for line in lines for ch in line})
+    cids = {ch: i + 1 for i, ch in enumerate(chars)}
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    bfchar = []
+    for start in range(0, len(chars), 100):
+        block = chars[start:start + 100]
+        bfchar.append(f"{len(block)} beginbfchar\n"
+                      + "\n".join(f"<{cids[c]:04X}> <{ord(c):04X}>" for c in block) + "\nendbfchar")
+    cmap = ("/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n"
+            "1 begincodespacerange <0000> <FFFF> endcodespacerange\n"
+            + "\n".join(bfchar) + "\nendcmap CMapName currentdict /CMap defineresource pop end end").encode()
+    to_unicode = add(b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream")
+    descendant = add(b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /SimSun "
+                     b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> /DW 1000 >>")
+    font = add(b"<< /Type /Font /Subtype /Type0 /BaseFont /SimSun /Encoding /Identity-H "
+               b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (descendant, to_unicode))
+
+    pages_id = len(objects) + 2 * len(pages) + 1
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 12 Tf", "16 TL", "50 800 Td"]
+        ops += ["<" + "".join(f"{cids[c]:04X}" for c in line) + "> Tj T*" for line in lines]
+        ops.append("ET")
+        content = "\n".join(ops).encode()
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                        b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, stream)))
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _load_font(size):
+    from PIL import ImageFont
+    for name in ("simsun.ttc", "msyh.ttc", "PingFang.ttc", "NotoSansCJK-Regular.ttc", "wqy-zenhei.ttc"):
+        with contextlib.suppress(OSError):
+            return ImageFont.truetype(name, size)
+    # 找不到中文字型時用內建字型；中文會變成方框，但頁面影像的大小與 OCR 負載仍然相近
+    return ImageFont.load_default()
+
+
+def render_page(lines, dpi=150):
+    """把文字行畫成一張 A4 白底頁面影像（模擬掃描件）"""
+    from PIL import Image, ImageDraw
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    font = _load_font(dpi // 6)
+    y = dpi // 2
+    for line in lines:
+        draw.text((dpi // 2, y), line, fill=0, font=font)
+        y += dpi // 4
+    return image
+
+
+def write_scanned_pdf(path, pages):
+    images = [render_page(lines) for lines in pages]
+    images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:])
+
+
+def write_mixed_pdf(path, pages):
+    """奇數頁為文字層、偶數頁為掃描影像"""
+    from PyPDF2 import PdfReader, PdfWriter
+    text_path, image_path = path + ".text.tmp", path + ".image.tmp"
+    write_text_pdf(text_path, pages)
+    write_scanned_pdf(image_path, pages)
+    try:
+        text_pages, image_pages = PdfReader(text_path).pages, PdfReader(image_path).pages
+        writer = PdfWriter()
+        for i in range(len(pages)):
+            writer.add_page(text_pages[i] if i % 2 == 0 else image_pages[i])
+        with open(path, "wb") as f:
+            writer.write(f)
+    finally:
+        os.remove(text_path)
+        os.remove(image_path)
+
+
+def write_large_docx(path, seed=0, contracts=LARGE_DOCX_CONTRACTS):
+    """把多份合約接成一份大 Word 檔，每份合約後面附一個需方 / 金額 / 付款 / 帳戶表格，並有頁首、頁尾"""
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "合同汇编（基准测试）"
+    doc.sections[0].footer.paragraphs[0].text = "仅供内部使用"
+    for index in range(contracts):
+        lines = contract_lines(rng, index)
+        for line in lines:
+            doc.add_paragraph(line)
+        table = doc.add_table(rows=4, cols=2)
+        for row, line in zip(table.rows, (lines[1], lines[3], lines[4], lines[7])):
+            label, _, value = line.partition("：")
+            row.cells[0].text = label
+            row.cells[1].text = value
+    doc.save(path)
+    return path
+
+
+def generate_corpus(corpus_dir, per_kind=5, seed=0):
+    """產生合成合約資料夾，回傳 {種類: [檔案路徑]}；相同 seed 會產生相同內容"""
+    rng = random.Random(seed)
+    if os.path.isdir(corpus_dir):
+        shutil.rmtree(corpus_dir)
+    os.makedirs(corpus_dir)
+    corpus = {kind: [] for kind in KINDS}
+    index = 0
+    for kind in KINDS:
+        for _ in range(per_kind):
+            index += 1
+            lines = contract_lines(rng, index)
+            ext = "docx" if kind.startswith("docx") else "pdf"
+            path = os.path.join(corpus_dir, f"{kind}_{index:03d}.{ext}")
+            if kind == "docx":
+                write_docx(path, lines)
+            elif kind == "docx_images":
+                write_docx(path, lines, image=render_page(lines[:5], dpi=72))
+            elif kind == "text_pdf":
+                write_text_pdf(path, paginate(lines))
+            elif kind == "scanned_pdf":
+                write_scanned_pdf(path, paginate(lines, per_page=20))
+            else:
+                write_mixed_pdf(path, paginate(lines, per_page=20))
+            corpus[kind].append(path)
+    return corpus
+
+
+def peak_rss_mb():
+    """目前為止本行程與子行程（OCR 行程池）的記憶體峰值；無法取得時回傳 None"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS 單位為 bytes，Linux 為 KB
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def measure(name, items, func, units=None):
+    """對每個 item 呼叫 func 並計時；回傳 (統計, 每個 item 的結果)，失敗的 item 結果為 None"""
+    print(f"⏱️  {name}：{len(items)} 項")
+    latencies, outputs, errors = [], [], []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        try:
+            outputs.append(func(item))
+        except Exception as e:
+            outputs.append(None)
+            errors.append(f"{os.path.basename(str(item))}: {e}"[:200])
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    units = len(items) if units is None else units
+    stats = {
+        "items": len(items),
+        "units": units,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "total_seconds": round(elapsed, 4),
+        "throughput_per_second": round(units / elapsed, 3) if elapsed > 0 else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return stats, outputs
+
+
+@contextlib.contextmanager
+def home_directory(path):
+    """generate_excel_report 寫到 ~/Documents/...；量測時暫時把家目錄指到基準測試資料夾"""
+    saved = {key: os.environ.get(key) for key in ("HOME", "USERPROFILE")}
+    os.environ["HOME"] = os.environ["USERPROFILE"] = os.path.abspath(path)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _run_python(args):
+    result = subprocess.run([sys.executable, *args], cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"結束代碼 {result.returncode}")
+    return result.stdout
+
+
+def import_entry_point(module):
+    """在全新的 Python 行程中匯入 module，回傳因此載入的重量級套件"""
+    return json.loads(_run_python(["-c", _IMPORT_PROBE, module, *HEAVY_MODULES]).strip().splitlines()[-1])
+
+
+def docx_rss_increase_mb(path, extractor):
+    """在全新的行程中以指定方式擷取一次，回傳擷取前後的記憶體峰值差；無法取得時回傳 None"""
+    try:
+        import resource  # noqa: F401
+    except ImportError:  # Windows
+        return None
+    before, after = map(int, _run_python(["-c", _DOCX_PROBE, extractor, os.path.abspath(path)]).split())
+    return round((after - before) / 1024, 1)
+
+
+def benchmark_docx_extractors(files, large_path):
+    """以同一批 Word 檔比較 python-docx 物件模型與直接解析 XML 的速度、記憶體與擷取到的字數"""
+    import read_doc
+
+    stages = {}
+    saved = read_doc.DOCX_EXTRACTOR
+    try:
+        for extractor in ("python-docx", "xml"):
+            read_doc.DOCX_EXTRACTOR = extractor
+            stats, outputs = measure(f"read_docx ({extractor})", files, read_doc.read_docx)
+            stats["characters"] = sum(len(t) for t in outputs if t)
+            stages[f"read_docx.{extractor}"] = stats
+            stats, outputs = measure(f"read_docx 大文件 ({extractor})", [large_path] * LARGE_DOCX_REPEATS,
+                                     read_doc.read_docx)
+            stats["characters"] = len(outputs[0] or "")
+            stats["rss_increase_mb"] = docx_rss_increase_mb(large_path, extractor)
+            stages[f"read_docx_large.{extractor}"] = stats
+    finally:
+        read_doc.DOCX_EXTRACTOR = saved
+    return stages
+
+
+def benchmark_startup(repeats=STARTUP_REPEATS):
+    """每個入口各量測 repeats 次；延遲包含 Python 直譯器本身的啟動時間"""
+    stages = {}
+    for module in ENTRY_POINTS:
+        stats, outputs = measure(f"import {module}", [module] * repeats, import_entry_point)
+        loaded = next((o for o in outputs if o is not None), None)
+        stats["heavy_modules"] = loaded
+        if loaded:
+            print(f"⚠️  匯入 {module} 時載入了 {', '.join(loaded)}")
+        stages[f"startup.import.{module}"] = stats
+    for script in HELP_SCRIPTS:
+        stats, _ = measure(f"{script} --help", [script] * repeats, lambda path: _run_python([path, "--help"]))
+        stages[f"startup.help.{script}"] = stats
+    return stages
+
+
+def ocr_all_pages(path):
+    """OCR 整份 PDF，回傳 (頁數, 各頁信心)"""
+    import read_doc
+    from pdf2image import pdfinfo_from_path
+    pages = read_doc.ocr_pages_with_confidence(path, range(1, pdfinfo_from_path(path)["Pages"] + 1))
+    return len(pages), [conf for _, conf in pages if conf is not None]
+
+
+def measure_ocr(name, files):
+    stats, outputs = measure(name, files, ocr_all_pages)
+    done = [o for o in outputs if o]
+    confidences = [c for _, confs in done for c in confs]
+    stats["pages"] = sum(n for n, _ in done)
+    stats["mean_confidence"] = round(sum(confidences) / len(confidences), 1) if confidences else None
+    return stats
+
+
+def benchmark_ocr_backends(files):
+    """以同一批掃描 PDF 比較各 OCR 後端（每頁啟動 tesseract vs. 常駐引擎）的速度與信心"""
+    import read_doc
+
+    stages = {}
+    saved = read_doc.OCR_BACKEND
+    try:
+        for backend in ("pytesseract", "tesserocr"):
+            if not read_doc.ocr_backend_available(backend):
+                stages[f"ocr_pdf.{backend}"] = {"skipped": "此電腦無法使用這個 OCR 後端"}
+                continue
+            read_doc.OCR_BACKEND = backend
+            stages[f"ocr_pdf.{backend}"] = measure_ocr(f"ocr_pdf ({backend})", files)
+    finally:
+        read_doc.OCR_BACKEND = saved
+    return stages
+
+
+# 轉影像設定的組合：原本的 200 DPI 彩色、灰階加裁邊、自動解析度加二值化與轉正
+RASTER_PRESETS = {
+    "rgb-200": {"OCR_DPI": 200, "OCR_COLOR": "rgb", "OCR_CROP_MARGINS": False, "OCR_DESKEW": False},
+    "gray-200-crop": {"OCR_DPI": 200, "OCR_COLOR": "gray", "OCR_CROP_MARGINS": True, "OCR_DESKEW": False},
+    "binary-auto": {"OCR_DPI": "auto", "OCR_COLOR": "binary", "OCR_CROP_MARGINS": True, "OCR_DESKEW": True},
+}
+
+
+def benchmark_ocr_raster(files):
+    """以目前的 OCR 後端比較各轉影像設定的速度與信心（記憶體峰值為累計值，只會遞增）"""
+    import read_doc
+
+    stages = {}
+    saved = {name: getattr(read_doc, name) for name in RASTER_PRESETS["rgb-200"]}
+    try:
+        for preset, settings in RASTER_PRESETS.items():
+            for name, value in settings.items():
+                setattr(read_doc, name, value)
+            stages[f"ocr_raster.{preset}"] = measure_ocr(f"ocr_pdf ({preset})", files)
+    finally:
+        for name, value in saved.items():
+            setattr(read_doc, name, value)
+    return stages
+
+
+def run_benchmark(args):
+    # 先在子行程中量測啟動時間，不受本行程已載入的模組影響
+    stages = benchmark_startup(args.startup_repeats)
+    if args.startup_only:
+        return {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {"startup_repeats": args.startup_repeats},
+            "stages": stages,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    from RPA統合程式測試 import analyze_folder, generate_excel_report
+    from read_doc import read_text_from_file
+    from ask_gemini import ask_gemini
+    from fake_gemini import FakeGenerativeModel
+    from rate_limiter import RateLimiter
+
+    print(f"🏗️  產生合成合約：每種 {args.per_kind} 份，seed={args.seed}")
+    started = time.perf_counter()
+    corpus = generate_corpus(args.corpus_dir, per_kind=args.per_kind, seed=args.seed)
+    files = [path for kind in KINDS for path in corpus[kind]]
+    stages["generate_corpus"] = {"items": len(files), "total_seconds": round(time.perf_counter() - started, 4)}
+
+    stats, outputs = measure("analyze_folder", [args.corpus_dir], analyze_folder, units=len(files))
+    stages["analyze_folder"] = stats
+    analysis = outputs[0] or {}
+
+    texts = {}
+    for kind in KINDS:
+        stats, outputs = measure(f"read_text_from_file ({kind})", corpus[kind], read_text_from_file)
+        stats["characters"] = sum(len(t) for t in outputs if t)
+        stages[f"read_text_from_file.{kind}"] = stats
+        texts.update((path, t) for path, t in zip(corpus[kind], outputs) if t)
+
+    print(f"🏗️  產生 {LARGE_DOCX_CONTRACTS} 份合約組成的大 Word 檔")
+    large_docx = write_large_docx(os.path.join(args.corpus_dir, LARGE_DOCX_NAME), seed=args.seed)
+    stages.update(benchmark_docx_extractors(corpus["docx"] + corpus["docx_images"], large_docx))
+    stages.update(benchmark_ocr_backends(corpus["scanned_pdf"]))
+    stages.update(benchmark_ocr_raster(corpus["scanned_pdf"]))
+
+    model = FakeGenerativeModel(latency=args.latency, quota_error_rate=args.error_rate, seed=args.seed)
+    limiter = RateLimiter(rpm=args.rpm, base_delay=args.base_delay, max_delay=args.base_delay * 8)
+    stats, _ = measure("ask_gemini", list(texts.values()),
+                       lambda text: ask_gemini(text, model=model, limiter=limiter))
+    stats.update({key: limiter.stats[key] for key in ("quota_errors", "retries", "failures")})
+    stages["ask_gemini"] = stats
+
+    image_files = analysis.get("image_files", [])
+    non_word_files = analysis.get("non_word_files", [])
+    with home_directory(args.corpus_dir):
+        stats, _ = measure("generate_excel_report", [None],
+                           lambda _: generate_excel_report(image_files, non_word_files),
+                           units=len(image_files) + len(non_word_files))
+    stages["generate_excel_report"] = stats
+
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"per_kind": args.per_kind, "seed": args.seed, "latency": args.latency,
+                   "error_rate": args.error_rate, "rpm": args.rpm},
+        "corpus": {kind: len(paths) for kind, paths in corpus.items()},
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(report, baseline=None):
+    print("\n=== 基準測試結果 ===")
+    print(f"{'階段':<36}{'吞吐量/秒':>10}{'p50 ms':>10}{'p95 ms':>10}{'錯誤':>6}")
+    for name, s in report["stages"].items():
+        if "p50_ms" not in s:
+            continue
+        line = f"{name:<38}{s['throughput_per_second'] or 0:>10.2f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['errors']:>6}"
+        old = (baseline or {}).get("stages", {}).get(name)
+        if old and old.get("p50_ms"):
+            change = (s["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            line += f"   p50 {change:+.0f}%"
+        print(line)
+    print(f"記憶體峰值：{report['peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="以合成合約量測各階段效能，結果寫成 JSON")
+    parser.add_argument("--per-kind", type=int, default=5, help="每種文件產生幾份")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.2, help="假模型每次呼叫的延遲秒數")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="假模型丟出 429 的機率")
+    parser.add_argument("--rpm", type=int, default=600, help="限流器的每分鐘請求數上限")
+    parser.add_argument("--base-delay", type=float, default=0.2, help="429 退避的基本秒數")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--output", help=f"結果 JSON 路徑（預設寫到 {DEFAULT_RESULTS_DIR}/）")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較 p50 延遲")
+    parser.add_argument("--startup-repeats", type=int, default=STARTUP_REPEATS, help="每個入口量測幾次啟動時間")
+    parser.add_argument("--startup-only", action="store_true", help="只量測各入口的啟動時間")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, datetime.datetime.now().strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"📄 已寫出 {output}")
@@ -0,0 +1,112 @@
+# clause_filter.py
+# 送給 Gemini 之前先在本機挑出與六個問題相關的條款（需方、金額與稅、付款方式、
+# 需方賬戶、開票與發貨時間、付款期限），只把這些條款與前後文放進提示詞
+import re
+import sys
+
+from rate_limiter import estimate_tokens
+
+# 短於此長度的文件直接送全文，篩選省不了多少
+MIN_PREFILTER_CHARS = 3000
+# 篩選後文字的上限（字元數）
+MAX_COMPACT_CHARS = 6000
+# 每個選中的條款額外帶入前後各幾個條款
+NEIGHBORS = 1
+
+# 各欄位的關鍵字；涵蓋簡體與繁體寫法
+FIELD_PATTERNS = {
+    "buyer": re.compile(r"需方|甲方|买方|買方|采购方|採購方|客户|客戶"),
+    "amount": re.compile(r"合同总额|合同總額|总价|總價|总金额|總金額|合同款|价款|價款|含税|含稅|不含税|不含稅|金额|金額|人民币|人民幣|[¥￥]|大写|大寫"),
+    "tax": re.compile(r"税率|稅率|税额|稅額|增值税|增值稅|\d+\s*[%％]"),
+    "payment": re.compile(r"付款|支付|电汇|電匯|承兑|承兌|汇票|匯票|转账|轉賬|轉帳|结算|結算|预付|預付|尾款"),
+    "account": re.compile(r"账户|賬戶|帳戶|账号|賬號|帳號|开户|開戶|户名|戶名|银行|銀行|税号|稅號"),
+    "invoice": re.compile(r"发票|發票|开票|開票|发货|發貨|交货|交貨|到货|到貨|验收|驗收|所有权|所有權"),
+    "deadline": re.compile(r"\d+\s*(个|個)?\s*(工作日|日|天|月)内|之日起|期限|前支付|到期|回款"),
+}
+NUMBER_PATTERN = re.compile(r"\d[\d,，.]*\s*(万元|萬元|元|%|％)")
+# 篩選結果必須涵蓋這些欄位，否則改送全文
+REQUIRED_FIELDS = ("buyer", "amount", "payment")
+
+CLAUSE_SPLIT = re.compile(r"(?<=[。；;])|\n")
+
+
+def filter_settings():
+    """會影響篩選結果的設定，用於執行清單與回應快取的指紋"""
+    # 包含正規表示式本身：修改關鍵字會改變送出的條款，舊的結果也要重做
+    return {"min_chars": MIN_PREFILTER_CHARS, "max_chars": MAX_COMPACT_CHARS,
+            "neighbors": NEIGHBORS, "fields": {name: p.pattern for name, p in FIELD_PATTERNS.items()},
+            "number": NUMBER_PATTERN.pattern, "split": CLAUSE_SPLIT.pattern, "required": REQUIRED_FIELDS}
+
+
+def split_clauses(text):
+    """以換行與句號、分號切成條款，去掉空白條款"""
+    return [c.strip() for c in CLAUSE_SPLIT.split(text) if c and c.strip()]
+
+
+def score_clause(clause):
+    """回傳 (分數, 命中的欄位)；每命中一個欄位 2 分，每個金額 / 百分比數字 1 分"""
+    fields = {name for name, pattern in FIELD_PATTERNS.items() if pattern.search(clause)}
+    return len(fields) * 2 + len(NUMBER_PATTERN.findall(clause)), fields
+
+
+def build_compact_text(text, max_chars=MAX_COMPACT_CHARS, neighbors=NEIGHBORS):
+    """回傳 (送給模型的文字, 統計)；篩選不可靠時回傳全文
+
+    統計包含 original_tokens、compact_tokens、saved_tokens 與 fallback（是否改用全文）
+    """
+    original_tokens = estimate_tokens(text)
+    full = (text, {"original_tokens": original_tokens, "compact_tokens": original_tokens,
+                   "saved_tokens": 0, "fallback": True})
+    if len(text) < MIN_PREFILTER_CHARS:
+        return full
+
+    clauses = split_clauses(text)
+    scored = [(score_clause(c), i) for i, c in enumerate(clauses)]
+    ranked = sorted(((s, fields, i) for (s, fields), i in scored if s > 0), key=lambda x: (-x[0], x[2]))
+
+    selected = set()
+    covered = set()
+    used_chars = 0
+    for score, fields, i in ranked:
+        window = [j for j in range(i - neighbors, i + neighbors + 1)
+                  if 0 <= j < len(clauses) and j not in selected]
+        added = sum(len(clauses[j]) + 1 for j in window)
+        if used_chars + added > max_chars:
+            continue
+        selected.update(window)
+        covered |= fields
+        used_chars += added
+
+    if not all(field in covered for field in REQUIRED_FIELDS):
+        return full
+
+    # 依原文順序輸出，不連續的地方以省略號隔開
+    parts = []
+    previous = None
+    for j in sorted(selected):
+        if previous is not None and j != previous + 1:
+            parts.append("……")
+        parts.append(clauses[j])
+        previous = j
+    compact = "\n".join(parts)
+    compact_tokens = estimate_tokens(compact)
+    if compact_tokens >= original_tokens:
+        return full
+    return compact, {"original_tokens": original_tokens, "compact_tokens": compact_tokens,
+                     "saved_tokens": original_tokens - compact_tokens, "fallback": False}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法：python clause_filter.py <txt檔案路徑>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        content = f.read()
+    compact, stats = build_compact_text(content)
+    print(compact)
+    print("\n=== 篩選統計 ===")
+    if stats["fallback"]:
+        print("使用全文（文件太短或篩選結果未涵蓋必要欄位）")
+    print(f"原文約 {stats['original_tokens']} tokens，送出約 {stats['compact_tokens']} tokens，"
+          f"節省 {stats['saved_tokens']} tokens")
@@ -0,0 +1,196 @@
+# contract_rules.py
+# 固定範本的合約常常可以直接用正規表示式解出 PROMPT_TEMPLATE 的六個欄位；
+# 每個欄位回傳答案與信心分數，信心不足的欄位才交給 Gemini
+import re
+import sys
+
+CONFIDENCE_THRESHOLD = 0.8
+RULES_VERSION = 3
+STANDARD_VAT_RATE = 13
+
+BUYER_PATTERN = re.compile(
+    r"(需方|买方|買方|采购方|採購方|甲方)(?:[（(][^）)\n]{0,10}[)）])?\s*[:：]\s*([^\n:：，,；;]{2,60})")
+COMPANY_SUFFIX = re.compile(r"(公司|厂|廠|院|所|中心|局|大学|大學|银行|銀行|集团|集團|医院|醫院)$")
+MONEY = r"(?:人民币|人民幣|RMB)?\s*[¥￥]?\s*([\d,，]+(?:\.\d+)?)\s*(万)?\s*元"
+TAXED_TOTAL_PATTERN = re.compile(r"(?:合同总(?:金)?额|合同總(?:金)?額|总价|總價|总金额|總金額|合计|合計)[^。\n]{0,15}?(?:含税|含稅)[^。\n\d]{0,10}?" + MONEY)
+UNTAXED_TOTAL_PATTERN = re.compile(r"(?:不含税|不含稅)[^。\n\d]{0,15}?" + MONEY)
+TAX_AMOUNT_PATTERN = re.compile(r"(?<!含)(?:税额|稅額|税金(?!额)|稅金(?!額))[^。\n\d]{0,10}?" + MONEY)
+PLAIN_TOTAL_PATTERN = re.compile(r"(?:合同总(?:金)?额|合同總(?:金)?額|总价|總價|总金额|總金額)[^。\n\d]{0,15}?" + MONEY)
+# 只認明寫的稅率（「税率13%」「增值税税率为13%」）；「增值税发票后付款30%」這類付款比例不是稅率
+TAX_RATE_PATTERN = re.compile(
+    r"(?:增值税税率|增值稅稅率|增值税率|增值稅率|税率|稅率)\s*(?:为|為|是)?\s*[:：]?\s*[（(]?\s*(\d+(?:\.\d+)?)\s*[%％]")
+PAYMENT_CONTEXT = re.compile(r"付款|支付|结算|結算|付清")
+WIRE_PATTERN = re.compile(r"电汇|電匯|T/T|\bTT\b|银行转账|銀行轉賬|銀行轉帳")
+ACCEPTANCE_PATTERN = re.compile(r"承兑汇票|承兌匯票|银行承兑|銀行承兌|商业承兑|商業承兌")
+# 同一個分句中付款方式前面有否定詞（「不接受承兑汇票」「除承兑汇票外」）時不算
+NEGATION = re.compile(r"不|拒|禁止|严禁|嚴禁|除")
+ACCOUNT_PATTERN = re.compile(r"(?:账号|賬號|帳號|账户|賬戶|帳戶)\s*[:：]\s*(\d[\d\s-]{6,30}\d)")
+PARTY_HEADER = re.compile(r"(需方|买方|買方|甲方|供方|卖方|賣方|乙方)")
+INVOICE_AFTER_DELIVERY = re.compile(
+    r"(发货|發貨|交货|交貨|到货|到貨|验收|驗收)[^。；;\n]{0,20}(后|後)[^。；;\n]{0,30}(开具|開具|开出|開出|提供)[^。；;\n]{0,10}(发票|發票)")
+INVOICE_BEFORE_DELIVERY = re.compile(
+    r"(合同签订|合同簽訂|签订合同|簽訂合同|发货前|發貨前|预付|預付)[^。；;\n]{0,30}(开具|開具|开出|開出|提供)[^。；;\n]{0,10}(发票|發票)")
+PAYMENT_DEADLINE = re.compile(
+    r"(\d+|[一二三四五六七八九十百]+)\s*(?:[（(]\d+[)）])?\s*(?:个|個)?\s*(工作日|日|天)\s*内[^。；;\n]{0,30}(支付|付款|付清|结清|結清)"
+    r"|\d{4}\s*年\s*\d{1,2}\s*月\s*\d{1,2}\s*日\s*(?:前|之前)[^。；;\n]{0,20}(支付|付款|付清)")
+# 付款期限必須出現在合同款項的付款條款中，違約金、保證金、退款等其他款項的期限不算
+PAYMENT_TERM_CONTEXT = re.compile(
+    r"合同款|合同价款|合同價款|合同费用|合同費用|合同总|合同總|货款|貨款|价款|價款|全部款项|全部款項|"
+    r"剩余|剩餘|尾款|余款|餘款|预付款|預付款|进度款|進度款|服务费|服務費|外包费用|外包費用")
+OTHER_PAYMENT_CONTEXT = re.compile(r"违约|違約|赔偿|賠償|罚|罰|滞纳|滯納|利息|保证金|保證金|押金|退还|退還|退回")
+
+
+def _parse_money(number, wan):
+    value = float(number.replace(",", "").replace("，", ""))
+    return value * 10000 if wan else value
+
+
+def _format_money(value):
+    return f"{value:,.2f}元"
+
+
+def rule_buyer(text):
+    match = BUYER_PATTERN.search(text)
+    if not match:
+        return None, 0.0
+    role, name = match.group(1), match.group(2).strip()
+    name = re.split(r"\s{2,}|\t", name)[0]
+    confidence = 0.9 if COMPANY_SUFFIX.search(name) else 0.6
+    if role not in ("需方", "买方", "買方", "采购方", "採購方"):
+        # 甲方不一定是需方，交給模型判斷
+        confidence = min(confidence, 0.6)
+    return name, confidence
+
+
+def rule_amounts(text):
+    rates = {float(m.group(1)) for m in TAX_RATE_PATTERN.finditer(text)}
+    taxed = TAXED_TOTAL_PATTERN.search(text)
+    untaxed = UNTAXED_TOTAL_PATTERN.search(text)
+    tax = TAX_AMOUNT_PATTERN.search(text)
+    if not rates:
+        return None, 0.0
+    if len(rates) > 1:
+        return None, 0.3  # 出現不只一個稅率（例如貨物與服務分開計稅），交給模型
+    rate = rates.pop()
+    if rate != STANDARD_VAT_RATE:
+        return f"未明确提及（警告：税率为{rate:g}%，不等于13%）", 0.9
+
+    if taxed is None:
+        plain = PLAIN_TOTAL_PATTERN.search(text)
+        if plain is None or untaxed is not None:
+            return None, 0.0
+        # 合約只寫總金額時，視為含稅總額
+        taxed_value = _parse_money(*plain.groups())
+    else:
+        taxed_value = _parse_money(*taxed.groups())
+
+    untaxed_value = round(taxed_value / (1 + rate / 100), 2)
+    tax_value = round(taxed_value - untaxed_value, 2)
+    confidence = 0.85
+    if untaxed is not None:
+        stated = _parse_money(*untaxed.groups())
+        if abs(stated - untaxed_value) > 1:
+            return None, 0.3  # 數字對不起來，交給模型
+        untaxed_value, confidence = stated, 0.95
+    if tax is not None and abs(_parse_money(*tax.groups()) - tax_value) > 1:
+        return None, 0.3
+    # 依題目順序：不含稅總額、稅額、含稅總額
+    answer = f"{_format_money(untaxed_value)}、{_format_money(tax_value)}、{_format_money(taxed_value)}"
+    return answer, confidence
+
+
+def _mentions(pattern, sentence):
+    """句子中是否肯定地提到 pattern（同一分句中前面沒有否定詞）"""
+    for clause in re.split(r"[，,、]", sentence):
+        match = pattern.search(clause)
+        if match and not NEGATION.search(clause[:match.start()]):
+            return True
+    return False
+
+
+def rule_payment_method(text):
+    methods = []
+    for sentence in re.split(r"[。；;\n]", text):
+        if not PAYMENT_CONTEXT.search(sentence):
+            continue
+        if _mentions(WIRE_PATTERN, sentence) and "电汇" not in methods:
+            methods.append("电汇")
+        if _mentions(ACCEPTANCE_PATTERN, sentence) and "承兑汇票" not in methods:
+            methods.append("承兑汇票")
+    if not methods:
+        return None, 0.0
+    return "、".join(methods), 0.9
+
+
+def rule_buyer_account(text):
+    """只在需方（或買方）的資料區塊中找賬號；找到恰好一個才有足夠信心"""
+    accounts = []
+    current_party = None
+    position = 0
+    for header in list(PARTY_HEADER.finditer(text)) + [None]:
+        end = header.start() if header else len(text)
+        if current_party in ("需方", "买方", "買方"):
+            accounts += ACCOUNT_PATTERN.findall(text[position:end])
+        if header is not None:
+            current_party, position = header.group(1), header.end()
+    accounts = [re.sub(r"\s+", "", a) for a in accounts]
+    if len(set(accounts)) == 1:
+        return accounts[0], 0.85
+    return None, 0.0
+
+
+def rule_invoice_risk(text):
+    if INVOICE_BEFORE_DELIVERY.search(text):
+        return "存在预开发票风险", 0.7
+    if INVOICE_AFTER_DELIVERY.search(text):
+        return "不存在预开发票风险", 0.85
+    return None, 0.0
+
+
+def rule_contract_type(text):
+    """合同款項的付款條款中明寫付款期限才是闭口合同；其他款項的期限不算"""
+    for sentence in re.split(r"[。；;\n]", text):
+        if (PAYMENT_DEADLINE.search(sentence) and PAYMENT_TERM_CONTEXT.search(sentence)
+                and not OTHER_PAYMENT_CONTEXT.search(sentence)):
+            return "闭口合同", 0.85
+    return None, 0.0
+
+
+# 題號 → 規則；題號與 ask_gemini.PROMPT_TEMPLATE 的六個問題相同
+RULES = {
+    1: rule_buyer,
+    2: rule_amounts,
+    3: rule_payment_method,
+    4: rule_buyer_account,
+    5: rule_invoice_risk,
+    6: rule_contract_type,
+}
+
+
+def extract_fields(text):
+    """回傳 {題號: (答案, 信心)}；規則找不到時答案為 None、信心為 0"""
+    results = {}
+    for number, rule in RULES.items():
+        try:
+            results[number] = rule(text)
+        except (ValueError, IndexError):
+            results[number] = (None, 0.0)
+    return results
+
+
+def resolved_fields(results, threshold=CONFIDENCE_THRESHOLD):
+    """只保留信心達門檻的欄位 {題號: 答案}"""
+    return {n: answer for n, (answer, confidence) in results.items()
+            if answer is not None and confidence >= threshold}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法：python contract_rules.py <txt檔案路徑>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        content = f.read()
+    for number, (answer, confidence) in extract_fields(content).items():
+        mark = "✅" if answer is not None and confidence >= CONFIDENCE_THRESHOLD else "🤖"
+        print(f"{mark} {number}. {answer or '（規則未解出）'}  信心 {confidence:.2f}")
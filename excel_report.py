@@ -0,0 +1,107 @@
+# excel_report.py
+# 以 openpyxl 的 write_only 模式逐列寫出 Excel 報告：每列產生後直接寫進檔案，不先建 DataFrame，
+# 記憶體用量與列數無關；表頭與資料格的格式以具名樣式共用，不逐格設定字型、框線
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+# 欄寬 = max(最小寬度, 最長內容字數 × WIDTH_FACTOR)，表頭也算在內容裡
+WIDTH_FACTOR = 1.2
+DEFAULT_MIN_WIDTH = 15
+
+HEADER_STYLE = "report_header"
+CELL_STYLE = "report_cell"
+CENTER_CELL_STYLE = "report_cell_center"
+
+
+def _thin_border():
+    side = Side(style='thin')
+    return Border(left=side, right=side, top=side, bottom=side)
+
+
+def report_styles():
+    """表頭：粗體 12 號字、淺藍底、置中；資料格：細框線，指定欄位水平置中"""
+    return [
+        NamedStyle(name=HEADER_STYLE, font=Font(bold=True, size=12),
+                   fill=PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid"),
+                   alignment=Alignment(horizontal='center', vertical='center'), border=_thin_border()),
+        # 具名樣式預設沒有字型，資料格沿用活頁簿的預設字型（Calibri 11）
+        NamedStyle(name=CELL_STYLE, font=DEFAULT_FONT, border=_thin_border()),
+        NamedStyle(name=CENTER_CELL_STYLE, font=DEFAULT_FONT, border=_thin_border(),
+                   alignment=Alignment(horizontal='center')),
+    ]
+
+
+class ColumnWidths:
+    """逐列累計每欄最長的內容，只保留每欄一個數字"""
+
+    def __init__(self, columns, min_widths=None):
+        self.columns = list(columns)
+        self.min_widths = [(min_widths or {}).get(c, DEFAULT_MIN_WIDTH) for c in self.columns]
+        self.max_lengths = [len(c) for c in self.columns]
+        self.rows = 0
+
+    def update(self, row):
+        for i, value in enumerate(row):
+            self.max_lengths[i] = max(self.max_lengths[i], len(str(value)))
+        self.rows += 1
+
+    def widths(self):
+        return [max(minimum, length * WIDTH_FACTOR) for minimum, length in zip(self.min_widths, self.max_lengths)]
+
+
+class StreamingReport:
+    """write_only 工作表：欄寬必須在第一列寫入前決定，之後每次 append 一列就寫進暫存檔"""
+
+    def __init__(self, path, sheet_name, columns, widths, centered=()):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        for style in report_styles():
+            self.workbook.add_named_style(style)
+        self.sheet = self.workbook.create_sheet(sheet_name)
+        for col_idx, width in enumerate(widths, 1):
+            self.sheet.column_dimensions[get_column_letter(col_idx)].width = width
+        self._header = self._styled_cells([HEADER_STYLE] * len(columns))
+        # write_only 工作表 append 時就把整列寫出，同一組儲存格可以重複用於每一列，樣式只需設定一次
+        self._cells = self._styled_cells([CENTER_CELL_STYLE if c in centered else CELL_STYLE for c in columns])
+        self.rows = 0
+        self._append(self._header, columns)
+
+    def _styled_cells(self, styles):
+        cells = []
+        for style in styles:
+            cell = WriteOnlyCell(self.sheet)
+            cell.style = style
+            cells.append(cell)
+        return cells
+
+    def _append(self, cells, values):
+        for cell, value in zip(cells, values):
+            cell.value = value
+        self.sheet.append(cells)
+
+    def append(self, row):
+        self._append(self._cells, row)
+        self.rows += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+def write_report(path, sheet_name, columns, rows, min_widths=None, centered=()):
+    """rows 為每次呼叫都回傳新的列迭代器的函式：第一輪只計算欄寬與列數，第二輪才寫出
+
+    兩輪都不保留列資料；沒有任何列時不建立檔案，回傳寫出的列數
+    """
+    tracker = ColumnWidths(columns, min_widths)
+    for row in rows():
+        tracker.update(row)
+    if tracker.rows == 0:
+        return 0
+    report = StreamingReport(path, sheet_name, columns, tracker.widths(), centered=centered)
+    for row in rows():
+        report.append(row)
+    report.close()
+    return report.rows
@@ -0,0 +1,153 @@
+# extract_cache.py
+# 以檔案內容雜湊 + 擷取設定為鍵，把擷取 / OCR 出來的文字存在本機 SQLite，
+# 重跑時檔案沒變就直接取用，不必再 OCR 一次
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = "extract_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 預設上限 512 MB
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """計算檔案內容的 SHA-256"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(file_path, settings, file_hash=None):
+    """快取鍵 = 檔案內容雜湊 + 擷取設定（OCR 語言、DPI、後端…）的雜湊
+
+    file_hash 為已算好的 SHA-256（例如執行清單的 file_hash），有傳入時不再讀檔計算
+    """
+    settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{file_hash or file_sha256(file_path)}:{settings_hash[:16]}"
+
+
+class ExtractCache:
+    """有容量上限、以最近使用時間 (LRU) 淘汰的擷取結果快取"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extract_cache (
+                key TEXT PRIMARY KEY,
+                source TEXT,
+                method TEXT,
+                text TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """回傳 (文字, 擷取方式)，沒有快取時回傳 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT text, method FROM extract_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE extract_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0], row[1]
+
+    def put(self, key, source, text, method):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extract_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, source, method, text, len(text.encode("utf-8")), now, now))
+            self.conn.commit()
+        self.prune(self.max_bytes)
+
+    def total_bytes(self):
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM extract_cache").fetchone()
+        return row[0], row[1]
+
+    def prune(self, max_bytes):
+        """刪除最久沒用到的項目，直到總大小不超過 max_bytes，回傳刪除筆數"""
+        removed = 0
+        with self._lock:
+            total, _ = self.total_bytes()
+            if total <= max_bytes:
+                return 0
+            for key, size in self.conn.execute(
+                    "SELECT key, size FROM extract_cache ORDER BY last_access").fetchall():
+                if total <= max_bytes:
+                    break
+                self.conn.execute("DELETE FROM extract_cache WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+            self.conn.commit()
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM extract_cache")
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+
+    def entries(self, limit=None):
+        sql = "SELECT source, method, size, created, last_access FROM extract_cache ORDER BY last_access DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def _format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="檢視與清理文字擷取快取")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH, help="快取檔案路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="顯示快取大小與筆數")
+    list_parser = sub.add_parser("list", help="列出快取項目（最近使用的在前）")
+    list_parser.add_argument("--limit", type=int, default=50)
+    prune_parser = sub.add_parser("prune", help="以 LRU 淘汰到指定大小")
+    prune_parser.add_argument("--max-mb", type=float, required=True)
+    sub.add_parser("clear", help="清空快取")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到快取檔案：{args.path}")
+        sys.exit(1)
+
+    cache = ExtractCache(args.path)
+    if args.command == "stats":
+        total, count = cache.total_bytes()
+        print(f"快取檔案：{args.path}")
+        print(f"共 {count} 筆，文字大小 {total / 1024 / 1024:.1f} MB，檔案大小 {os.path.getsize(args.path) / 1024 / 1024:.1f} MB")
+    elif args.command == "list":
+        for source, method, size, created, last_access in cache.entries(args.limit):
+            print(f"{_format_time(last_access)}  {method:<5} {size:>10,d} B  {source}")
+    elif args.command == "prune":
+        removed = cache.prune(int(args.max_mb * 1024 * 1024))
+        print(f"🧹 已刪除 {removed} 筆快取")
+    elif args.command == "clear":
+        cache.clear()
+        print("🧹 已清空快取")
+    cache.close()
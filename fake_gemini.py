@@ -0,0 +1,103 @@
+# fake_gemini.py
+# 本機假的 Gemini 模型，用來在不消耗配額的情況下測試限流、重試與批次流程
+import re
+import json
+import random
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+FAKE_RESPONSE = """1. 需方：测试需方有限公司
+2. 合同款项总额（不含税）：100000元，税额（税率13%）：13000元，合同款项总额（含税）：113000元
+3. 付款方式：电汇
+4. 需方账户：未明确提及
+5. 是否有预开发票风险：不存在预开发票风险
+6. 是开口还是闭口合同：闭口合同
+"""
+
+BATCH_DOC_ID = re.compile(r"^=== 文件编号：(.+?) ===$", re.M)
+
+
+class ResourceExhausted(Exception):
+    """模擬 google.api_core.exceptions.ResourceExhausted (HTTP 429)"""
+    code = 429
+
+
+class FakeGenerativeModel:
+    """介面與 genai.GenerativeModel 相同的假模型
+
+    latency: 每次呼叫的延遲秒數
+    quota_error_rate: 隨機丟出 429 的機率
+    rpm_limit: 若設定，過去 60 秒內超過此請求數就丟出 429（模擬真實配額）
+    batch_drop_rate: 批次請求中每份文件被漏掉的機率（模擬模型漏答）
+    """
+
+    def __init__(self, model_name="fake-gemini", latency=0.0, quota_error_rate=0.0,
+                 rpm_limit=None, response_text=FAKE_RESPONSE, seed=None, batch_drop_rate=0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.rpm_limit = rpm_limit
+        self.response_text = response_text
+        self.batch_drop_rate = batch_drop_rate
+        self.calls = 0
+        self.quota_errors = 0
+        self._recent = []
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _check_quota(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 60]
+            over_limit = self.rpm_limit is not None and len(self._recent) >= self.rpm_limit
+            if over_limit or self._random.random() < self.quota_error_rate:
+                self.quota_errors += 1
+                raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+            self._recent.append(now)
+
+    def generate_content(self, prompt, **kwargs):
+        self._check_quota()
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self._check_quota()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt):
+        doc_ids = BATCH_DOC_ID.findall(prompt)
+        if doc_ids:
+            # 批次提示詞：每份文件回傳一個 JSON 物件
+            with self._lock:
+                kept = [i for i in doc_ids if self._random.random() >= self.batch_drop_rate]
+            items = [{"id": i, "result": self.response_text.strip()} for i in kept]
+            return SimpleNamespace(text=json.dumps(items, ensure_ascii=False))
+        return SimpleNamespace(text=self.response_text)
+
+
+if __name__ == '__main__':
+    # 示範：以假模型跑一批請求，觀察限流器的實際吞吐量
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    from rate_limiter import RateLimiter
+
+    parser = argparse.ArgumentParser(description="以假 Gemini 模型測試限流器")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(latency=args.latency, quota_error_rate=args.error_rate)
+    limiter = RateLimiter(rpm=args.rpm, base_delay=0.2, max_delay=2.0)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(lambda i: limiter.call(model.generate_content, f"prompt {i}", tokens=1000),
+                          range(args.requests)))
+    limiter.print_summary()
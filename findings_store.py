@@ -0,0 +1,114 @@
+# findings_store.py
+# 有疑慮的合約逐筆附加到本機 SQLite（只新增不改寫），
+# 整批處理結束後再一次匯出成 file_report.xlsx
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+DEFAULT_STORE_PATH = "findings.sqlite"
+REPORT_PATH = "file_report.xlsx"
+
+
+def write_findings_excel(rows, report_path=REPORT_PATH):
+    """把 (檔案名稱, 疑慮摘要) 寫成 Excel 報告，回傳筆數
+
+    先寫到同一資料夾的暫存檔再取代：多台電腦同時匯出到共用資料夾時，不會留下寫一半的報告
+    """
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=["檔案名稱", "疑慮摘要"])
+    fd, temp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(os.path.abspath(report_path)))
+    os.close(fd)
+    try:
+        df.to_excel(temp_path, index=False)
+        os.replace(temp_path, report_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return len(df)
+
+
+class FindingsStore:
+    """只能附加的疑慮紀錄；WAL 模式讓多個行程可同時寫入而不會互相覆蓋"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, legacy_report=REPORT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS findings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT,
+                summary TEXT,
+                created REAL
+            )
+        """)
+        self.conn.commit()
+        # 第一次建立時，把舊版直接寫入的 Excel 報告搬進來，匯出時才不會遺失
+        if is_new and legacy_report and os.path.exists(legacy_report):
+            self.import_excel(legacy_report)
+
+    def append(self, filename, summary):
+        with self._lock:
+            self.conn.execute("INSERT INTO findings (filename, summary, created) VALUES (?, ?, ?)",
+                              (filename, summary, time.time()))
+            self.conn.commit()
+
+    def rows(self, latest_only=True):
+        """回傳 (檔案名稱, 疑慮摘要)；latest_only 時同一檔案只保留最新的一筆"""
+        sql = "SELECT filename, summary FROM findings"
+        if latest_only:
+            sql += " WHERE id IN (SELECT MAX(id) FROM findings GROUP BY filename)"
+        sql += " ORDER BY id"
+        with self._lock:
+            return self.conn.execute(sql).fetchall()
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM findings").fetchone()[0]
+
+    def import_excel(self, report_path):
+        import pandas as pd
+        df = pd.read_excel(report_path)
+        if "檔案名稱" not in df.columns or "疑慮摘要" not in df.columns:
+            return 0
+        for filename, summary in zip(df["檔案名稱"], df["疑慮摘要"]):
+            self.append(str(filename), "" if pd.isna(summary) else str(summary))
+        print(f"📥 已匯入舊報告 {report_path} 的 {len(df)} 筆紀錄")
+        return len(df)
+
+    def export_excel(self, report_path=REPORT_PATH, latest_only=True):
+        """一次寫出 Excel 報告，回傳寫出的筆數"""
+        return write_findings_excel(self.rows(latest_only=latest_only), report_path)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="匯出疑慮紀錄為 Excel 報告")
+    parser.add_argument("--path", default=DEFAULT_STORE_PATH, help="疑慮紀錄檔案路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help=f"匯出成 Excel（預設 {REPORT_PATH}）")
+    export_parser.add_argument("--output", default=REPORT_PATH)
+    export_parser.add_argument("--all", action="store_true", help="保留同一檔案的所有歷史紀錄")
+    sub.add_parser("stats", help="顯示紀錄筆數")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到疑慮紀錄檔案：{args.path}")
+        sys.exit(1)
+
+    store = FindingsStore(args.path)
+    if args.command == "export":
+        count = store.export_excel(args.output, latest_only=not args.all)
+        print(f"📊 已匯出 {count} 筆疑慮紀錄到 {args.output}")
+    elif args.command == "stats":
+        print(f"共 {store.count()} 筆紀錄，{len(store.rows())} 個檔案")
+    store.close()
@@ -0,0 +1,253 @@
+# instrumentation.py
+# 各階段（圖片檢查、Word 轉 PDF、PDF 文字 / OCR、讀 Word、Gemini、寫疑慮紀錄）的耗時與資源紀錄：
+# 每個檔案、每個階段寫一行 JSON 到追蹤檔，整批結束時印出彙總表
+# 沒有呼叫 enable_tracing() 時 span 幾乎沒有額外開銷
+import os
+import sys
+import json
+import time
+import uuid
+import functools
+import threading
+import contextvars
+
+DEFAULT_TRACE_PATH = "trace.jsonl"
+# 追蹤檔超過此大小時，開始新的一次執行前先改名為 trace.jsonl.1（只保留一份舊檔）
+MAX_TRACE_BYTES = 50 * 1024 * 1024
+# 彙總表中加總的數值欄位
+SUM_FIELDS = ("pages", "characters", "prompt_tokens", "response_tokens", "retries")
+
+_tracer = None
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """把 span 附加寫入 JSON Lines 追蹤檔，並保留本次執行的紀錄供彙總
+
+    每次執行附加在同一個檔案（以 run 區分），檔案超過 max_bytes 時先輪替，不會無限制變大
+    """
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, max_bytes=MAX_TRACE_BYTES):
+        self.path = path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self._lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + ".1")
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        record["run"] = self.run_id
+        with self._lock:
+            self.records.append(record)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class _SpanCollector:
+    """行程池的子行程中使用：span 只留在記憶體，由父行程取回後寫入自己的追蹤檔"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+class Span:
+    """一個階段的一次執行；結束時記錄牆鐘時間、本執行緒 CPU 時間與 set() 加上的欄位
+
+    CPU 時間不含子行程（OCR 行程池）；在 asyncio 中會包含同一執行緒上其他工作的 CPU 時間
+    """
+
+    def __init__(self, stage, file=None, **fields):
+        self.stage = stage
+        self.file = file
+        self.fields = fields
+        self._token = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def increment(self, name, amount=1):
+        self.fields[name] = self.fields.get(name, 0) + amount
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if self.file is None and parent is not None:
+            # 內層階段沿用外層的檔案名稱，例如 ask_gemini 沿用 analyze 的檔案
+            self.file = parent.file
+        self._token = _current_span.set(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        tracer = _tracer
+        if tracer is None:
+            return False
+        record = {
+            "ts": time.time(),
+            "stage": self.stage,
+            "file": self.file,
+            "wall_ms": round((time.perf_counter() - self._wall) * 1000, 3),
+            "cpu_ms": round((time.thread_time() - self._cpu) * 1000, 3),
+            "ok": exc_type is None,
+        }
+        if exc is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"[:300]
+        record.update(self.fields)
+        tracer.write(record)
+        return False
+
+
+class _NullSpan:
+    """未啟用追蹤時使用，不做任何事"""
+
+    def set(self, **fields):
+        pass
+
+    def increment(self, name, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage, file=None, **fields):
+    """with span("read_pdf", file=path) as s: ...; s.set(pages=3)"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(stage, file=None if file is None else os.path.basename(str(file)), **fields)
+
+
+def traced(stage, file_arg=0):
+    """裝飾器：以第 file_arg 個位置參數當作檔案名稱記錄整個函式"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            file = args[file_arg] if file_arg is not None and len(args) > file_arg else None
+            with span(stage, file=file):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """回傳目前的 span（例如讓限流器記下重試次數），未啟用追蹤時回傳不做事的 span"""
+    return _current_span.get() or _NULL_SPAN
+
+
+def enable_tracing(path=DEFAULT_TRACE_PATH):
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def disable_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def tracing_enabled():
+    return _tracer is not None
+
+
+def init_worker_tracing(enabled):
+    """行程池的 initializer：子行程不寫追蹤檔（fork 時會繼承父行程開啟的檔案），
+    enabled 時改為收集 span，由 collect_worker_spans() 隨擷取結果一起交回父行程"""
+    global _tracer
+    _tracer = _SpanCollector() if enabled else None
+
+
+def collect_worker_spans():
+    """在子行程中取出並清空目前收集到的 span"""
+    if not isinstance(_tracer, _SpanCollector):
+        return []
+    records, _tracer.records = _tracer.records, []
+    return records
+
+
+def merge_worker_spans(records):
+    """在父行程中把子行程的 span 寫入追蹤檔，並納入本次執行的彙總表"""
+    if _tracer is not None:
+        for record in records:
+            _tracer.write(record)
+
+
+def summarize(records):
+    """依階段彙總：次數、失敗數、總耗時、平均 / p95 耗時、CPU 時間與各數值欄位的加總"""
+    stages = {}
+    for r in records:
+        stages.setdefault(r["stage"], []).append(r)
+    summary = {}
+    for stage, rows in stages.items():
+        walls = sorted(r["wall_ms"] for r in rows)
+        item = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if not r.get("ok", True)),
+            "wall_ms": sum(walls),
+            "mean_ms": sum(walls) / len(walls),
+            "p95_ms": walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+            "cpu_ms": sum(r.get("cpu_ms", 0) for r in rows),
+        }
+        for name in SUM_FIELDS:
+            item[name] = sum(r.get(name, 0) or 0 for r in rows)
+        summary[stage] = item
+    return summary
+
+
+def print_summary(records):
+    summary = summarize(records)
+    if not summary:
+        return
+    print("\n=== 各階段耗時 ===")
+    print(f"{'stage':<24}{'count':>6}{'err':>5}{'total s':>9}{'mean ms':>9}{'p95 ms':>9}{'cpu s':>8}"
+          f"{'pages':>7}{'chars':>10}{'in tok':>9}{'out tok':>9}{'retry':>6}")
+    for stage, s in sorted(summary.items(), key=lambda item: -item[1]["wall_ms"]):
+        print(f"{stage:<24}{s['count']:>6}{s['errors']:>5}{s['wall_ms'] / 1000:>9.1f}{s['mean_ms']:>9.1f}"
+              f"{s['p95_ms']:>9.1f}{s['cpu_ms'] / 1000:>8.1f}{s['pages']:>7}{s['characters']:>10}"
+              f"{s['prompt_tokens']:>9}{s['response_tokens']:>9}{s['retries']:>6}")
+
+
+def print_run_summary():
+    """印出本次執行的彙總表（未啟用追蹤時不做事）"""
+    if _tracer is not None:
+        print_summary(_tracer.records)
+        print(f"🧾 追蹤紀錄：{_tracer.path}（run {_tracer.run_id}）")
+
+
+def load_trace(path, run_id=None):
+    """讀取追蹤檔；未指定 run_id 時只取最後一次執行的紀錄"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and records:
+        run_id = records[-1]["run"]
+    return [r for r in records if r.get("run") == run_id]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="彙總追蹤檔中各階段的耗時")
+    parser.add_argument("path", nargs="?", default=DEFAULT_TRACE_PATH, help="追蹤檔路徑")
+    parser.add_argument("--run", help="執行編號（預設為最後一次執行）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到追蹤檔：{args.path}")
+        sys.exit(1)
+    print_summary(load_trace(args.path, args.run))
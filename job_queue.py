@@ -0,0 +1,371 @@
+# job_queue.py
+# 以 SQLite 檔案當作工作佇列：每個檔案一筆工作，記錄狀態（pending / extracting / analyzing / done / failed）、
+# 租約與重試次數；任意數量的 worker 行程（同一台或多台電腦，佇列檔放在共用磁碟上）都可以從中領取工作，
+# 中斷後重新執行只會接著處理未完成的檔案
+import os
+import sys
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_QUEUE_PATH = "job_queue.sqlite"
+# 租約到期仍未完成（worker 當機或失聯）的工作，會被其他 worker 重新領取
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 5
+STATES = ("pending", "extracting", "analyzing", "done", "failed")
+ACTIVE_STATES = ("extracting", "analyzing")
+# SQL 中 state IN (...) 的參數佔位符，狀態本身以參數傳入
+_ACTIVE_PLACEHOLDERS = ", ".join("?" for _ in ACTIVE_STATES)
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+
+def worker_name(thread=None):
+    """worker 名稱 = 主機名稱:行程編號[:執行緒序號]，用來辨識租約的持有者"""
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    return name if thread is None else f"{name}:{thread}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def file_signature(path):
+    """回傳 (大小, 修改時間)；領取工作時記下，重新加入佇列時據此判斷檔案是否被修改或替換
+
+    只比對是否相同、不比先後，保留原修改時間的複製（cp -p、解壓縮、同步工具）與各主機時鐘不一致都不影響；
+    檔案不存在時回傳 (None, None)
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_size, st.st_mtime
+
+
+def find_files(paths):
+    """展開資料夾，回傳所有 PDF / Word（.docx）檔案的絕對路徑"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                files += [os.path.join(root, f) for f in sorted(filenames)
+                          if f.lower().endswith(SUPPORTED_EXTENSIONS) and not f.startswith("~$")]
+        else:
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+
+class JobQueue:
+    """檔案為單位的工作佇列，可供多個執行緒、多個行程與多台電腦同時使用
+
+    不使用 WAL：WAL 需要共用記憶體，放在網路磁碟上時多台電腦無法正確鎖定，
+    改用傳統的 rollback journal，每次領取工作都在 BEGIN IMMEDIATE 交易中完成
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                state TEXT,
+                attempts INTEGER DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                error TEXT,
+                enqueued REAL,
+                started REAL,
+                finished REAL,
+                size INTEGER,
+                mtime REAL
+            )
+        """)
+        # 舊版佇列檔沒有 size / mtime 欄位：補上後，舊的已完成工作會在下次加入時重新處理一次
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("size", "INTEGER"), ("mtime", "REAL")):
+            if column not in columns:
+                try:
+                    self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError:
+                    pass  # 其他行程剛好同時補上
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def enqueue(self, paths):
+        """加入新檔案，並把內容已變更（大小或修改時間與領取時不同）的已完成 / 失敗工作放回 pending
+
+        等待中與處理中的工作不變；回傳新加入與重新放回的數量
+        """
+        now = time.time()
+        rows = [(os.path.abspath(p),) + file_signature(p) for p in paths]
+        added = 0
+        with self._transaction() as conn:
+            for path, size, mtime in rows:
+                cursor = conn.execute("INSERT OR IGNORE INTO jobs (path, state, enqueued) VALUES (?, 'pending', ?)",
+                                      (path, now))
+                if cursor.rowcount == 0:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, enqueued = ? "
+                        "WHERE path = ? AND state IN ('done', 'failed') AND (size IS NOT ? OR mtime IS NOT ?)",
+                        (now, path, size, mtime))
+                added += cursor.rowcount
+        return added
+
+    def recover(self):
+        """把本機上已結束的行程持有的工作放回 pending，不必等租約到期；回傳放回的數量"""
+        host = socket.gethostname()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT path, worker FROM jobs WHERE state IN ({_ACTIVE_PLACEHOLDERS}) AND worker LIKE ?",
+                ACTIVE_STATES + (host + ":%",)).fetchall()
+            dead = [path for path, worker in rows if not _pid_alive(int(worker.split(":")[1]))]
+            conn.executemany("UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL "
+                             "WHERE path = ?", [(p,) for p in dead])
+        return len(dead)
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """領取一筆待處理或租約已到期的工作，回傳檔案路徑；沒有可領的工作時回傳 None
+
+        租約到期且已用完重試次數的工作直接標為 failed
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE jobs SET state = 'failed', worker = NULL, lease_until = NULL, finished = ?, "
+                f"error = COALESCE(error, '租約到期') WHERE state IN ({_ACTIVE_PLACEHOLDERS}) "
+                f"AND lease_until < ? AND attempts >= ?", (now,) + ACTIVE_STATES + (now, self.max_attempts))
+            row = conn.execute(
+                f"SELECT path FROM jobs WHERE state = 'pending' "
+                f"OR (state IN ({_ACTIVE_PLACEHOLDERS}) AND lease_until < ?) ORDER BY enqueued, path LIMIT 1",
+                ACTIVE_STATES + (now,)).fetchone()
+            if row is None:
+                return None
+            size, mtime = file_signature(row[0])
+            conn.execute(
+                "UPDATE jobs SET state = 'extracting', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "started = ?, size = ?, mtime = ? WHERE path = ?",
+                (worker, now + lease_seconds, now, size, mtime, row[0]))
+        return row[0]
+
+    def _update_owned(self, sql, params, path, worker):
+        """只更新仍由 worker 持有的工作；租約已被別人接手時回傳 False"""
+        with self._transaction() as conn:
+            return conn.execute(sql + " WHERE path = ? AND worker = ?", params + (path, worker)).rowcount == 1
+
+    def advance(self, path, worker, state, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """進入下一個階段（例如 analyzing）並延長租約"""
+        return self._update_owned("UPDATE jobs SET state = ?, lease_until = ?",
+                                  (state, time.time() + lease_seconds), path, worker)
+
+    def renew(self, path, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self._update_owned("UPDATE jobs SET lease_until = ?", (time.time() + lease_seconds,), path, worker)
+
+    def complete(self, path, worker):
+        return self._update_owned(
+            "UPDATE jobs SET state = 'done', worker = NULL, lease_until = NULL, error = NULL, finished = ?",
+            (time.time(),), path, worker)
+
+    def fail(self, path, worker, error):
+        """記錄失敗；還有重試次數時放回 pending，否則標為 failed"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE path = ? AND worker = ?",
+                               (path, worker)).fetchone()
+            if row is None:
+                return False
+            state = "pending" if row[0] < self.max_attempts else "failed"
+            conn.execute("UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, error = ?, finished = ? "
+                         "WHERE path = ?", (state, str(error)[:1000], time.time(), path))
+        return True
+
+    @contextmanager
+    def keep_alive(self, path, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """處理期間在背景每隔租約的 1/3 延長一次，長時間的 OCR 才不會被當成失聯"""
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(lease_seconds / 3):
+                if not self.renew(path, worker, lease_seconds):
+                    return
+
+        thread = threading.Thread(target=renew_loop, name=f"lease-{worker}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def has_open_jobs(self):
+        """還有待處理或處理中的工作（處理中的工作可能失敗後重試）"""
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT 1 FROM jobs WHERE state = 'pending' OR state IN ({_ACTIVE_PLACEHOLDERS}) LIMIT 1",
+                ACTIVE_STATES).fetchone() is not None
+
+    def retry_failed(self):
+        """把 failed 的工作重設為 pending 並清除重試次數，回傳數量"""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL "
+                                "WHERE state = 'failed'").rowcount
+
+    def paths(self, state):
+        """某個狀態的所有檔案路徑，依完成時間排序"""
+        with self._lock:
+            return [path for (path,) in self.conn.execute(
+                "SELECT path FROM jobs WHERE state = ? ORDER BY finished, path", (state,))]
+
+    def counts(self):
+        with self._lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def active(self):
+        """處理中的工作：(路徑, 狀態, worker, 租約剩餘秒數)"""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT path, state, worker, lease_until FROM jobs WHERE state IN ({_ACTIVE_PLACEHOLDERS}) "
+                f"ORDER BY started", ACTIVE_STATES).fetchall()
+        now = time.time()
+        return [(path, state, worker, lease_until - now) for path, state, worker, lease_until in rows]
+
+    def throughput(self, window_seconds=600):
+        """回傳 (最近 window_seconds 秒內完成的數量, 每分鐘完成數, 開始處理以來每分鐘完成數)"""
+        now = time.time()
+        with self._lock:
+            recent = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'done' AND finished >= ?",
+                                       (now - window_seconds,)).fetchone()[0]
+            first, last, done = self.conn.execute(
+                "SELECT MIN(started), MAX(finished), COUNT(*) FROM jobs WHERE state = 'done'").fetchone()
+        overall = done / ((last - first) / 60) if done and last > first else 0.0
+        # 剛開始處理時，以實際經過的時間計算最近的速度
+        elapsed = min(window_seconds, now - first) if first else window_seconds
+        return recent, recent / (elapsed / 60) if elapsed > 0 else 0.0, overall
+
+    def failures(self, limit=20):
+        with self._lock:
+            return self.conn.execute("SELECT path, attempts, error FROM jobs WHERE state = 'failed' "
+                                     "ORDER BY finished DESC LIMIT ?", (limit,)).fetchall()
+
+    def print_status(self, window_seconds=600):
+        counts = self.counts()
+        total = sum(counts.values())
+        done = counts.get("done", 0)
+        print(f"佇列檔案：{self.path}，共 {total} 個檔案，已完成 {done} 個"
+              f"（{done / total * 100 if total else 0:.1f}%）")
+        for state in STATES:
+            print(f"  {state:<11}{counts.get(state, 0)}")
+        recent, rate, overall = self.throughput(window_seconds)
+        print(f"最近 {window_seconds // 60:.0f} 分鐘完成 {recent} 個（{rate:.1f} 個/分鐘），"
+              f"開始以來平均 {overall:.1f} 個/分鐘")
+        remaining = counts.get("pending", 0) + sum(counts.get(s, 0) for s in ACTIVE_STATES)
+        speed = rate or overall
+        if remaining and speed:
+            print(f"預估剩餘時間：約 {remaining / speed:.0f} 分鐘")
+        active = self.active()
+        if active:
+            print("處理中：")
+            for path, state, worker, remaining_lease in active:
+                lease = f"租約剩 {remaining_lease:.0f} 秒" if remaining_lease > 0 else "租約已到期"
+                print(f"  {os.path.basename(path)}  {state}  {worker}  {lease}")
+        failures = self.failures()
+        if failures:
+            print("失敗：")
+            for path, attempts, error in failures:
+                print(f"  ❌ {os.path.basename(path)}（嘗試 {attempts} 次）：{error}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="檔案處理的工作佇列：加入工作、啟動 worker、查看進度")
+    parser.add_argument("--path", default=DEFAULT_QUEUE_PATH, help="佇列檔案路徑（多台電腦時放在共用磁碟上）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enqueue = sub.add_parser("enqueue", help="加入檔案或資料夾中的所有 PDF / .docx")
+    enqueue.add_argument("paths", nargs="+")
+    work = sub.add_parser("work", help="啟動 worker，處理到佇列中沒有工作為止")
+    work.add_argument("--threads", type=int, default=4, help="同時處理的檔案數")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="租約秒數")
+    work.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="每個檔案最多嘗試次數")
+    work.add_argument("--rpm", type=int, help="這個 worker 每分鐘請求數上限（多台電腦時依台數分配配額）")
+    work.add_argument("--tpm", type=int, help="這個 worker 每分鐘 token 數上限")
+    work.add_argument("--prefilter", action="store_true", help="只把相關條款送給 Gemini")
+    work.add_argument("--rules", action="store_true", help="先以本機規則解析欄位")
+    work.add_argument("--wait", action="store_true", help="佇列清空後繼續等待新工作，不結束")
+    work.add_argument("--output-dir", help="TXT / RESULT 與疑慮報告的上層資料夾（預設為佇列檔所在的資料夾）")
+    export = sub.add_parser("export", help="以佇列中已完成的檔案產生涵蓋所有 worker 的疑慮報告")
+    export.add_argument("--output-dir", help="worker 寫出 TXT / RESULT 的上層資料夾（預設為佇列檔所在的資料夾）")
+    export.add_argument("--report", help="報告路徑（預設為 --output-dir 中的 file_report.xlsx）")
+    status = sub.add_parser("status", help="顯示各狀態的檔案數、吞吐量與處理中的工作")
+    status.add_argument("--window", type=float, default=10, help="計算吞吐量的時間範圍（分鐘）")
+    sub.add_parser("retry-failed", help="把失敗的工作重設為待處理")
+    args = parser.parse_args()
+
+    if args.command != "enqueue" and not os.path.exists(args.path):
+        print(f"❌ 找不到佇列檔案：{args.path}")
+        sys.exit(1)
+
+    queue = JobQueue(args.path, max_attempts=getattr(args, "max_attempts", DEFAULT_MAX_ATTEMPTS))
+    # 佇列檔放在共用磁碟上時，各台電腦的輸出也寫到同一個共用資料夾
+    output_dir = getattr(args, "output_dir", None) or os.path.dirname(os.path.abspath(args.path))
+    if args.command == "enqueue":
+        files = find_files(args.paths)
+        print(f"📥 已加入 {queue.enqueue(files)} 個新的或內容已變更的檔案（共找到 {len(files)} 個）")
+    elif args.command == "status":
+        queue.print_status(window_seconds=args.window * 60)
+    elif args.command == "retry-failed":
+        print(f"🔁 已重設 {queue.retry_failed()} 個失敗的工作")
+    elif args.command == "export":
+        from process_all import export_queue_report, RESULT_DIR
+        from findings_store import REPORT_PATH
+        report = args.report or os.path.join(output_dir, REPORT_PATH)
+        count = export_queue_report(queue, os.path.join(output_dir, RESULT_DIR), report)
+        print(f"📊 已匯出 {count} 筆疑慮紀錄到 {report}")
+    elif args.command == "work":
+        from ask_gemini import require_api_key
+        from process_all import BatchContext, run_queue_worker, export_queue_report
+        from rate_limiter import RateLimiter, DEFAULT_RPM, DEFAULT_TPM
+        from extract_cache import ExtractCache
+        from response_cache import ResponseCache
+        from run_manifest import RunManifest
+        from findings_store import FindingsStore, REPORT_PATH
+
+        require_api_key()
+        ctx = BatchContext(limiter=RateLimiter(rpm=args.rpm or DEFAULT_RPM, tpm=args.tpm or DEFAULT_TPM),
+                           cache=ExtractCache(), response_cache=ResponseCache(), store=FindingsStore(),
+                           manifest=RunManifest(), prefilter=args.prefilter, rules=args.rules,
+                           output_dir=output_dir)
+        try:
+            run_queue_worker(queue, ctx, threads=args.threads, lease_seconds=args.lease,
+                             exit_when_empty=not args.wait)
+            # 結束前以整個佇列的結果更新共用的疑慮報告（也可隨時以 export 指令產生）
+            report = os.path.join(output_dir, REPORT_PATH)
+            print(f"📊 已匯出 {export_queue_report(queue, ctx.result_dir, report)} 筆疑慮紀錄到 {report}")
+        finally:
+            for resource in (ctx.cache, ctx.response_cache, ctx.store, ctx.manifest):
+                resource.close()
+    queue.close()
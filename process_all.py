@@ -1,79 +1,683 @@
 import os
-import subprocess
-import shutil
-import time
 import sys
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # 匯入並執行 RPA 統合程式的主函式
 from RPA統合程式測試 import main as rpa_main
-
-# Step 0: 執行 Word→PDF 轉換與 Excel 報告分析
-print("📁 執行文件分析與 Word → PDF 轉換")
-try:
-    rpa_main()
-except Exception as e:
-    print(f"❌ RPA 統合程式執行失敗：{e}")
-    sys.exit(1)
+# 在同一個行程內直接呼叫擷取與分析函式，不再每個檔案啟動新的 Python
+from read_doc import read_text_with_method, extractor_settings
+from ask_gemini import (ask_gemini, is_suspicious, log_suspicious, extract_suspicious_part, require_api_key,
+                        REPORT_PATH, PROMPT_TEMPLATE, MODEL_NAME, GENERATION_CONFIG,
+                        QUESTIONS, parse_answers, format_answers,
+                        ask_gemini_batch, pack_batches, BATCH_PROMPT_TEMPLATE, BATCH_DOC_MAX_TOKENS)
+from findings_store import FindingsStore, write_findings_excel
+from rate_limiter import RateLimiter, DEFAULT_RPM, DEFAULT_TPM, estimate_tokens
+from extract_cache import ExtractCache, DEFAULT_CACHE_PATH
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH as DEFAULT_RESPONSE_CACHE_PATH, DEFAULT_TTL_DAYS
+from run_manifest import RunManifest, DEFAULT_MANIFEST_PATH, config_fingerprint
+from clause_filter import build_compact_text, filter_settings
+from contract_rules import extract_fields, resolved_fields, RULES_VERSION, CONFIDENCE_THRESHOLD
+from similarity_index import (SimilarityIndex, similarity_settings, DEFAULT_INDEX_PATH as DEFAULT_SIMILARITY_PATH,
+                              SIMILARITY_THRESHOLD)
+from job_queue import JobQueue, worker_name, DEFAULT_LEASE_SECONDS, DEFAULT_POLL_SECONDS
+from instrumentation import span, enable_tracing, disable_tracing, print_run_summary, DEFAULT_TRACE_PATH
 
 # 設定資料夾
 PDF_DIR = os.path.expanduser("~/Documents/會資/Final Project/PDF_2")
 TXT_DIR = "TXT"
 RESULT_DIR = "RESULT"
 
-os.makedirs(TXT_DIR, exist_ok=True)
-os.makedirs(RESULT_DIR, exist_ok=True)
 
-# Step 1 ~ Step 3: 處理所有 PDF 檔案
-for filename in os.listdir(PDF_DIR):
-    if filename.lower().endswith(".pdf"):
-        pdf_path = os.path.join(PDF_DIR, filename)
-        base_name = os.path.splitext(filename)[0]
-        txt_filename = base_name + ".txt"
-        txt_path = os.path.join(TXT_DIR, txt_filename)
-        result_path = os.path.join(RESULT_DIR, txt_filename)
+class BatchContext:
+    """整批處理共用的物件；沒有用到的功能保持 None 即可"""
+
+    def __init__(self, limiter=None, model=None, cache=None, response_cache=None, store=None,
+                 manifest=None, prefilter=False, rules=False, batch=False, similarity=None, output_dir=None):
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.model = model
+        self.cache = cache
+        self.response_cache = response_cache
+        self.store = store
+        self.manifest = manifest
+        self.prefilter = prefilter
+        self.prefilter_stats = []
+        self.rules = rules
+        self.rule_stats = []
+        self.batch = batch
+        self.batch_stats = []  # 每個批次請求的 (文件數, 需要單獨重試的文件數)
+        self.similarity = similarity  # similarity_index.SimilarityIndex
+        # TXT / RESULT 所在的上層資料夾（預設為目前的資料夾）；多台電腦共用工作佇列時設為佇列所在的共用資料夾，
+        # 各台電腦的結果才會寫在同一處，job_queue.py export 才能從中產生完整的報告
+        self.txt_dir = os.path.join(output_dir, TXT_DIR) if output_dir else TXT_DIR
+        self.result_dir = os.path.join(output_dir, RESULT_DIR) if output_dir else RESULT_DIR
+
+    def make_output_dirs(self):
+        os.makedirs(self.txt_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+
+    def analysis_config(self):
+        """會影響分析結果的設定，用於執行清單的指紋"""
+        return {"template": PROMPT_TEMPLATE, "model": MODEL_NAME, "generation_config": GENERATION_CONFIG,
+                "prefilter": filter_settings() if self.prefilter else None,
+                "rules": {"version": RULES_VERSION, "threshold": CONFIDENCE_THRESHOLD} if self.rules else None,
+                "batch_template": BATCH_PROMPT_TEMPLATE if self.batch else None,
+                "similarity": similarity_settings(self.similarity.threshold) if self.similarity is not None else None}
+
+    def reuse_config(self):
+        """相似度索引中可以互相沿用結果的分析設定（不含相似度設定本身）"""
+        config = self.analysis_config()
+        config.pop("similarity")
+        return config
+
+    def print_summary(self):
+        self.limiter.print_summary()
+        if self.cache is not None:
+            print(f"📦 擷取快取：命中 {self.cache.hits} 次，未命中 {self.cache.misses} 次")
+        if self.response_cache is not None:
+            self.response_cache.print_summary()
+        if self.manifest is not None:
+            print(f"⏭️  執行清單：{self.manifest.skipped} 個檔案已是最新，略過")
+        if self.prefilter_stats:
+            original = sum(s["original_tokens"] for s in self.prefilter_stats)
+            saved = sum(s["saved_tokens"] for s in self.prefilter_stats)
+            fallback = sum(1 for s in self.prefilter_stats if s["fallback"])
+            print(f"✂️  條款篩選：{len(self.prefilter_stats)} 份文件共節省約 {saved} / {original} tokens，"
+                  f"{fallback} 份使用全文")
+        if self.rule_stats:
+            local_only = sum(1 for n in self.rule_stats if n == len(QUESTIONS))
+            print(f"📏 本機規則：{len(self.rule_stats)} 份文件共解出 {sum(self.rule_stats)} 個欄位，"
+                  f"{local_only} 份完全不需呼叫 Gemini")
+        if self.similarity is not None:
+            self.similarity.print_summary()
+        if self.batch_stats:
+            docs = sum(n for n, _ in self.batch_stats)
+            retried = sum(r for _, r in self.batch_stats)
+            print(f"📚 批次分析：{len(self.batch_stats)} 個請求共分析 {docs} 份文件，"
+                  f"{retried} 份缺漏或格式錯誤，改為單獨分析")
+
+
+def stage_fingerprints(file_path, file_hash, ctx):
+    """TXT 依擷取設定、RESULT 與報告依提示模板、模型與篩選設定決定是否需要重做"""
+    txt = config_fingerprint(file_hash, extractor_settings(file_path))
+    analysis = config_fingerprint(txt, ctx.analysis_config())
+    return {"txt": txt, "result": analysis, "report": analysis}
+
+
+def new_record(file_path):
+    filename = os.path.basename(file_path)
+    return {"file": filename, "path": file_path, "txt": os.path.splitext(filename)[0] + ".txt",
+            "status": "ok", "method": None, "error": None, "fingerprints": None}
 
-        # Step 1: Extract text
-        print(f"📄 Extracting: {filename}")
-        try:
-            result = subprocess.run(
-                ["python", "read_doc.py", pdf_path],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            output_text = result.stdout
-            if "⚠️ PDF" in output_text:
-                print(f"🧐 {filename} → 使用 OCR 擷取")
-            else:
-                print(f"✅ {filename} → 使用普通文字擷取")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 讀取 PDF 失敗：{filename}")
-            continue
 
-        raw_txt_path = os.path.splitext(pdf_path)[0] + ".txt"
-        if os.path.exists(raw_txt_path):
-            shutil.move(raw_txt_path, txt_path)
+def extract_file(file_path, cache=None, record=None, executor=None, txt_dir=TXT_DIR, file_hash=None):
+    """Step 1：擷取文字並寫出 TXT，回傳 (處理紀錄, 文字)；失敗時文字為 None
+
+    file_path 可以是 PDF，也可以是直接讀取的 .docx；executor 為擷取用的行程池；TXT 寫到 txt_dir；
+    file_hash 為執行清單已算好的檔案雜湊，傳給擷取快取
+    """
+    if record is None:
+        record = new_record(file_path)
+    filename = record["file"]
+
+    print(f"📄 Extracting: {filename}")
+    try:
+        with span("extract", file=file_path) as s:
+            text, method = read_text_with_method(file_path, cache=cache, executor=executor, file_hash=file_hash)
+            s.set(method=method, characters=len(text))
+        record["method"] = method
+        if method == "ocr":
+            print(f"🧐 {filename} → 使用 OCR 擷取")
+        elif method.startswith("mixed"):
+            print(f"🧐 {filename} → 文字層 + 部分頁面 OCR 擷取 {method}")
+        elif method == "docx":
+            print(f"✅ {filename} → 直接讀取 Word 文字")
         else:
-            print(f"⚠️ 找不到輸出的 TXT 檔案：{raw_txt_path}")
-            continue
+            print(f"✅ {filename} → 使用普通文字擷取")
+        with open(os.path.join(txt_dir, record["txt"]), 'w', encoding='utf-8') as f:
+            f.write(text)
+    except Exception as e:
+        print(f"❌ 讀取檔案失敗：{filename}，錯誤：{e}")
+        record.update(status="extract_failed", error=str(e))
+        return record, None
+    return record, text
+
+
+class AnalysisPlan:
+    """呼叫 Gemini 之前的準備結果：result 不為 None 時不必呼叫 Gemini，
+    否則以 text 詢問 fields 這幾題（None 表示全部），再以 merge_answers 併入 resolved
+
+    exact 表示沿用了內容相同文件的結果；similar 表示 text 只含與近似文件的差異條款
+    """
+
+    def __init__(self, result=None, text=None, fields=None, resolved=None, exact=False, similar=False):
+        self.result = result
+        self.text = text
+        self.fields = fields
+        self.resolved = resolved or {}
+        self.exact = exact
+        self.similar = similar
+
+
+def apply_similarity(text, ctx, txt_filename):
+    """啟用相似度索引時回傳已分析過的相似文件（similarity_index.Match），否則回傳 None"""
+    if ctx.similarity is None:
+        return None
+    match = ctx.similarity.find(text, ctx.reuse_config())
+    if match is None:
+        return None
+    if match.exact:
+        print(f"♻️  {txt_filename} → 與 {match.source} 內容相同，沿用分析結果")
+    elif not match.fields:
+        print(f"♻️  {txt_filename} → 與 {match.source} 近似（{match.similarity:.0%}），"
+              f"差異條款不影響答案，沿用分析結果")
+    else:
+        print(f"♻️  {txt_filename} → 與 {match.source} 近似（{match.similarity:.0%}），"
+              f"{match.changed} 個條款不同，只重問第 {'、'.join(map(str, match.fields))} 題")
+    return match
+
+
+def remember_analysis(text, result, plan, ctx, txt_filename):
+    """把新分析的文件加入相似度索引，供之後的相似文件沿用"""
+    if ctx.similarity is not None and not plan.exact:
+        ctx.similarity.add(text, ctx.reuse_config(), result, source=txt_filename)
 
-        # Step 2: Analyze with Gemini
+
+def apply_rules(text, ctx, txt_filename):
+    """回傳本機規則解出的答案 {題號: 含題目的答案行}；未啟用規則時為空"""
+    if not ctx.rules:
+        return {}
+    resolved = {n: QUESTIONS[n] + answer for n, answer in resolved_fields(extract_fields(text)).items()}
+    ctx.rule_stats.append(len(resolved))
+    if resolved:
+        print(f"📏 {txt_filename} → 本機規則解出 {len(resolved)}/{len(QUESTIONS)} 個欄位")
+    return resolved
+
+
+def apply_prefilter(text, ctx, txt_filename):
+    """啟用條款篩選時回傳只含相關條款的文字，否則原樣回傳"""
+    if not ctx.prefilter:
+        return text
+    # 只送出與六個問題相關的條款
+    text, stats = build_compact_text(text)
+    ctx.prefilter_stats.append(stats)
+    if stats["fallback"]:
+        print(f"✂️  {txt_filename} → 使用全文（約 {stats['original_tokens']} tokens）")
+    else:
+        print(f"✂️  {txt_filename} → 篩選相關條款，約 {stats['original_tokens']} → "
+              f"{stats['compact_tokens']} tokens，節省 {stats['saved_tokens']} tokens")
+    return text
+
+
+def merge_answers(result, resolved):
+    """以本機規則的答案覆蓋模型回應中的對應欄位"""
+    if not resolved:
+        return result
+    answers = parse_answers(result)
+    if not answers:
+        # 回應格式無法解析時保留原文，避免遺失模型的判斷
+        return format_answers(resolved) + "\n" + result
+    answers.update(resolved)
+    return format_answers(answers)
+
+
+def plan_analysis(text, ctx, txt_filename):
+    """依設定依序套用相似文件、本機規則與條款篩選，回傳 AnalysisPlan"""
+    match = apply_similarity(text, ctx, txt_filename)
+    if match is not None and (match.exact or not match.fields):
+        return AnalysisPlan(result=match.result, exact=match.exact)
+    resolved = apply_rules(text, ctx, txt_filename)
+    if match is not None:
+        # 近似文件：沒受差異影響的題目沿用舊答案，規則解出的答案優先
+        reused = {n: answer for n, answer in parse_answers(match.result).items() if n not in match.fields}
+        if len(reused) + len(match.fields) < len(QUESTIONS):
+            print(f"🔁 {txt_filename} → {match.source} 的分析結果缺題，改為分析全文")
+            match = None
+        else:
+            resolved = {**reused, **resolved}
+    if len(resolved) == len(QUESTIONS):
+        return AnalysisPlan(result=format_answers(resolved))
+    # 只問規則解不出（或近似文件中有差異）的欄位
+    fields = [n for n in QUESTIONS if n not in resolved] if resolved else None
+    if match is not None:
+        return AnalysisPlan(text=match.prompt_text, fields=fields, resolved=resolved, similar=True)
+    return AnalysisPlan(text=apply_prefilter(text, ctx, txt_filename), fields=fields, resolved=resolved)
+
+
+def run_analysis(text, ctx, txt_filename):
+    """必要時才呼叫 Gemini，回傳與 Gemini 相同格式的分析結果"""
+    plan = plan_analysis(text, ctx, txt_filename)
+    result = plan.result
+    if result is None:
+        result = ask_gemini(plan.text, model=ctx.model, limiter=ctx.limiter, cache=ctx.response_cache,
+                            fields=plan.fields)
+        result = merge_answers(result, plan.resolved)
+    remember_analysis(text, result, plan, ctx, txt_filename)
+    return result
+
+
+def analyze_file(record, text, ctx):
+    """Step 2 ~ 3：Gemini 分析並寫出 RESULT，有疑慮就附加到疑慮紀錄"""
+    txt_filename = record["txt"]
+    result_path = os.path.join(ctx.result_dir, txt_filename)
+    manifest = ctx.manifest
+    fingerprints = record["fingerprints"]
+
+    if manifest is not None and manifest.is_done(record["path"], "result", fingerprints["result"]):
+        # 分析結果已是最新，只差報告這一步（例如上次在寫入報告前中斷）
+        with open(result_path, 'r', encoding='utf-8') as f:
+            result = f.read()
+    else:
         print(f"🤖 Analyzing: {txt_filename}")
         try:
-            subprocess.run(["python", "ask_gemini.py", txt_path], check=True)
-        except subprocess.CalledProcessError:
-            print(f"❌ Gemini 分析失敗：{txt_filename}")
+            with span("analyze", file=record["file"]):
+                result = run_analysis(text, ctx, txt_filename)
+        except Exception as e:
+            print(f"❌ Gemini 分析失敗：{txt_filename}，錯誤：{e}")
+            record.update(status="analyze_failed", error=str(e))
+            return record
+
+        write_result(record, result, ctx)
+    return report_file(record, result, ctx)
+
+
+def write_result(record, result, ctx):
+    result_path = os.path.join(ctx.result_dir, record["txt"])
+    with open(result_path, 'w', encoding='utf-8') as f:
+        f.write(result)
+    if ctx.manifest is not None:
+        ctx.manifest.mark_done(record["path"], "result", record["fingerprints"]["result"], output_path=result_path)
+
+
+def report_file(record, result, ctx):
+    """有疑慮就附加到疑慮紀錄，並在執行清單記下報告階段"""
+    txt_filename = record["txt"]
+    manifest = ctx.manifest
+    suspicious = is_suspicious(result)
+    if suspicious:
+        print(f"⚠️ 有疑慮，記錄到疑慮紀錄")
+        log_suspicious(txt_filename, result, store=ctx.store)
+    if manifest is not None:
+        manifest.mark_done(record["path"], "report", record["fingerprints"]["report"],
+                           output="suspicious" if suspicious else "ok")
+    return record
+
+
+def analyze_batch(items, ctx):
+    """Step 2 ~ 3（批次）：多份短文件合併成一個請求，回傳處理紀錄的清單
+
+    回應中缺漏或格式錯誤的文件，以及整個批次請求失敗時，改為逐份呼叫 Gemini；
+    近似文件只需重問部分題目，不放進批次
+    """
+    docs = {}
+    pending = {}
+    results = {}
+    for i, (record, text) in enumerate(items):
+        plan = plan_analysis(text, ctx, record["txt"])
+        pending[str(i)] = (record, text, plan)
+        if plan.result is not None:
+            # 沿用相似文件或規則已解出全部欄位，不必放進批次
+            results[str(i)] = plan.result
+        elif not plan.similar:
+            docs[str(i)] = plan.text
+
+    if docs:
+        print(f"📚 Analyzing batch: {', '.join(pending[i][0]['txt'] for i in docs)}")
+        try:
+            answered = ask_gemini_batch(docs, model=ctx.model, limiter=ctx.limiter, cache=ctx.response_cache)
+        except Exception as e:
+            print(f"❌ 批次分析失敗，改為逐份分析，錯誤：{e}")
+            answered = {}
+        ctx.batch_stats.append((len(docs), len(docs) - len(answered)))
+        for doc_id, result in answered.items():
+            results[doc_id] = merge_answers(result, pending[doc_id][2].resolved)
+
+    records = []
+    for doc_id, (record, text, plan) in pending.items():
+        if doc_id not in results:
+            if doc_id in docs:
+                print(f"🔁 {record['txt']} → 批次回應缺漏或格式錯誤，單獨分析")
+            try:
+                result = ask_gemini(plan.text, model=ctx.model, limiter=ctx.limiter,
+                                    cache=ctx.response_cache, fields=plan.fields)
+            except Exception as e:
+                print(f"❌ Gemini 分析失敗：{record['txt']}，錯誤：{e}")
+                record.update(status="analyze_failed", error=str(e))
+                records.append(record)
+                continue
+            results[doc_id] = merge_answers(result, plan.resolved)
+        remember_analysis(text, results[doc_id], plan, ctx, record["txt"])
+        write_result(record, results[doc_id], ctx)
+        records.append(report_file(record, results[doc_id], ctx))
+    return records
+
+
+def is_batchable(record, text, ctx):
+    """批次模式下，夠短且分析結果不是最新的文件才併入批次"""
+    if not ctx.batch or estimate_tokens(text) > BATCH_DOC_MAX_TOKENS:
+        return False
+    manifest = ctx.manifest
+    return manifest is None or not manifest.is_done(record["path"], "result", record["fingerprints"]["result"])
+
+
+def load_or_extract(file_path, ctx, executor=None):
+    """依執行清單決定要重做哪些階段；回傳 (處理紀錄, 文字)，不需要再分析時文字為 None"""
+    record = new_record(file_path)
+    manifest = ctx.manifest
+    if manifest is None:
+        return extract_file(file_path, cache=ctx.cache, record=record, executor=executor, txt_dir=ctx.txt_dir)
+
+    try:
+        file_hash = manifest.file_hash(file_path)
+        fingerprints = stage_fingerprints(file_path, file_hash, ctx)
+    except OSError as e:
+        print(f"❌ 讀取檔案失敗：{record['file']}，錯誤：{e}")
+        record.update(status="extract_failed", error=str(e))
+        return record, None
+    record["fingerprints"] = fingerprints
+
+    if (manifest.is_done(file_path, "result", fingerprints["result"])
+            and manifest.is_done(file_path, "report", fingerprints["report"])):
+        record["status"] = "skipped"
+        manifest.skipped += 1
+        return record, None
+
+    # TXT 已是最新時直接讀回來，不必再擷取
+    txt_path = os.path.join(ctx.txt_dir, record["txt"])
+    if manifest.is_done(file_path, "txt", fingerprints["txt"]):
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            record["method"] = manifest.get(file_path, "txt", fingerprints["txt"])
+            return record, f.read()
+
+    # 執行清單已算過雜湊，擷取快取不必再讀一次檔案
+    record, text = extract_file(file_path, cache=ctx.cache, record=record, executor=executor, txt_dir=ctx.txt_dir,
+                                file_hash=file_hash)
+    if text is not None:
+        manifest.mark_done(file_path, "txt", fingerprints["txt"], output=record["method"],
+                           output_path=txt_path)
+    return record, text
+
+
+def process_file(file_path, ctx=None):
+    """處理單一檔案：擷取文字 → Gemini 分析 → 寫出 TXT / RESULT，回傳處理紀錄"""
+    ctx = ctx if ctx is not None else BatchContext()
+    record, text = load_or_extract(file_path, ctx)
+    if text is None:
+        return record
+    return analyze_file(record, text, ctx)
+
+
+def list_pdfs(pdf_dir, exclude_stems=()):
+    """列出資料夾中的 PDF；exclude_stems 中的主檔名（已直接讀取的 .docx 的封存 PDF）會略過"""
+    exclude_stems = set(exclude_stems)
+    return [os.path.join(pdf_dir, filename) for filename in sorted(os.listdir(pdf_dir))
+            if filename.lower().endswith(".pdf") and os.path.splitext(filename)[0] not in exclude_stems]
+
+
+def process_folder(pdf_dir, ctx=None, workers=4):
+    """處理資料夾中的所有 PDF"""
+    return process_files(list_pdfs(pdf_dir), ctx=ctx, workers=workers)
+
+
+def process_files(file_paths, ctx=None, workers=4):
+    """依序擷取檔案文字，並以 workers 個執行緒在配額內同時呼叫 Gemini"""
+    ctx = ctx if ctx is not None else BatchContext()
+    ctx.make_output_dirs()
+
+    records = []
+    futures = []
+    batch = []
+    # 限制排隊中的請求數量，避免擷取速度遠快於分析時文字堆滿記憶體
+    pending = threading.BoundedSemaphore(workers * 2)
+
+    def submit(func, *args):
+        pending.acquire()
+        future = executor.submit(func, *args)
+        future.add_done_callback(lambda _: pending.release())
+        futures.append(future)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for file_path in file_paths:
+            record, text = load_or_extract(file_path, ctx)
+            if text is None:
+                records.append(record)
+                continue
+            if is_batchable(record, text, ctx):
+                # 累積到超過 token 上限或文件數上限時，送出前面已湊滿的批次
+                batch.append((record, text))
+                *full, batch = pack_batches(batch)
+                for items in full:
+                    submit(analyze_batch, items, ctx)
+                continue
+            submit(lambda r, t: [analyze_file(r, t, ctx)], record, text)
+        if batch:
+            submit(analyze_batch, batch, ctx)
+        for future in futures:
+            records.extend(future.result())
+
+    ctx.print_summary()
+    return records
+
+
+def process_queued_file(file_path, queue, worker, ctx, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """處理佇列中的一個檔案，並把各階段狀態與結果記回佇列；回傳處理紀錄"""
+    try:
+        with queue.keep_alive(file_path, worker, lease_seconds):
+            record, text = load_or_extract(file_path, ctx)
+            if text is not None:
+                queue.advance(file_path, worker, "analyzing", lease_seconds)
+                record = analyze_file(record, text, ctx)
+    except Exception as e:
+        print(f"❌ 處理失敗：{os.path.basename(file_path)}，錯誤：{e}")
+        record = new_record(file_path)
+        record.update(status="failed", error=str(e))
+    if record["status"] in ("ok", "skipped"):
+        queue.complete(file_path, worker)
+    else:
+        queue.fail(file_path, worker, record["error"])
+    return record
+
+
+def run_queue_worker(queue, ctx=None, threads=4, lease_seconds=DEFAULT_LEASE_SECONDS,
+                     exit_when_empty=True, poll_seconds=DEFAULT_POLL_SECONDS, stop=None):
+    """以 threads 個執行緒從工作佇列（job_queue.JobQueue）領取檔案處理，回傳處理紀錄
+
+    exit_when_empty 時佇列中沒有待處理與處理中的工作就結束，否則持續等待新工作；
+    stop 為 threading.Event，設定後各執行緒處理完手上的檔案就結束（Ctrl+C 時也會設定）
+    """
+    ctx = ctx if ctx is not None else BatchContext()
+    ctx.make_output_dirs()
+    stop = stop if stop is not None else threading.Event()
+    recovered = queue.recover()
+    if recovered:
+        print(f"♻️  本機上次中斷時處理中的 {recovered} 個檔案已放回佇列")
+
+    records = []
+
+    def work(n):
+        worker = worker_name(n)
+        while not stop.is_set():
+            file_path = queue.claim(worker, lease_seconds)
+            if file_path is None:
+                if exit_when_empty and not queue.has_open_jobs():
+                    return
+                # 其他 worker 處理中的檔案可能失敗後重試，或有新加入的檔案
+                stop.wait(poll_seconds)
+                continue
+            records.append(process_queued_file(file_path, queue, worker, ctx, lease_seconds))
+
+    workers = [threading.Thread(target=work, args=(n,), name=f"queue-worker-{n}") for n in range(threads)]
+    for t in workers:
+        t.start()
+    try:
+        while any(t.is_alive() for t in workers):
+            for t in workers:
+                t.join(timeout=1)
+    except KeyboardInterrupt:
+        print("\n⏹️  等待處理中的檔案完成後停止（再按一次 Ctrl+C 強制結束，未完成的檔案會重新領取）")
+        stop.set()
+        for t in workers:
+            t.join()
+
+    ctx.print_summary()
+    return records
+
+
+def export_queue_report(queue, result_dir=RESULT_DIR, report_path=REPORT_PATH):
+    """以工作佇列中已完成的檔案與 result_dir 中的 RESULT 產生疑慮報告，回傳筆數
+
+    各台電腦的 worker 只把疑慮紀錄寫到自己的 findings.sqlite；RESULT 寫在共用資料夾時，
+    由這裡產生的報告才涵蓋所有電腦的處理結果
+    """
+    rows = []
+    for path in queue.paths("done"):
+        txt_filename = new_record(path)["txt"]
+        try:
+            with open(os.path.join(result_dir, txt_filename), 'r', encoding='utf-8') as f:
+                result = f.read()
+        except OSError as e:
+            print(f"⚠️  找不到 {os.path.basename(path)} 的分析結果：{e}")
             continue
+        if is_suspicious(result):
+            rows.append((txt_filename, extract_suspicious_part(result)))
+    return write_findings_excel(rows, report_path)
 
-        # Step 3: Move result
-        raw_result_path = os.path.splitext(txt_path)[0] + "_result.txt"
-        if os.path.exists(raw_result_path):
-            shutil.move(raw_result_path, result_path)
-        else:
-            print(f"⚠️ 找不到分析結果：{raw_result_path}")
 
-        # Step 4: Sleep to respect quota limits
-        print(f"⏳ 等待 8 秒避免配額限制...")
-        time.sleep(8)
+def print_summary(records):
+    """顯示每個檔案的處理結果"""
+    failed = [r for r in records if r["status"] not in ("ok", "skipped")]
+    skipped = sum(1 for r in records if r["status"] == "skipped")
+    print("\n=== 處理結果摘要 ===")
+    print(f"共處理 {len(records)} 個檔案，成功 {len(records) - len(failed) - skipped} 個，"
+          f"略過 {skipped} 個，失敗 {len(failed)} 個")
+    for r in failed:
+        print(f"❌ {r['file']} - {r['status']}: {r['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次擷取 PDF / Word 文字並交給 Gemini 分析")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="每分鐘請求數上限")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="每分鐘 token 數上限")
+    parser.add_argument("--workers", type=int, default=4, help="同時進行的 Gemini 請求數")
+    parser.add_argument("--extract-cache", default=DEFAULT_CACHE_PATH, help="文字擷取快取檔案路徑")
+    parser.add_argument("--no-extract-cache", action="store_true", help="不使用文字擷取快取")
+    parser.add_argument("--response-cache", default=DEFAULT_RESPONSE_CACHE_PATH, help="Gemini 回應快取檔案路徑")
+    parser.add_argument("--response-ttl-days", type=float, default=DEFAULT_TTL_DAYS, help="回應快取有效天數")
+    parser.add_argument("--no-response-cache", action="store_true", help="不使用 Gemini 回應快取")
+    parser.add_argument("--direct-docx", action="store_true",
+                        help=".docx 直接擷取文字，不先經過 Word → PDF 轉換")
+    parser.add_argument("--no-archive-pdf", action="store_true",
+                        help="搭配 --direct-docx：不在背景把 .docx 轉成 PDF 封存")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="執行清單檔案路徑")
+    parser.add_argument("--full", action="store_true", help="忽略執行清單，全部重新處理")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="只把與付款、發票、稅額、賬戶等相關的條款送給 Gemini")
+    parser.add_argument("--rules", action="store_true",
+                        help="先以本機規則解析六個欄位，只把信心不足的欄位交給 Gemini")
+    parser.add_argument("--batch", action="store_true",
+                        help="把多份短文件合併成一個 Gemini 請求，以 JSON 回傳各文件的結果")
+    parser.add_argument("--similar", action="store_true",
+                        help="沿用內容相同或近似的已分析合約：相同的直接沿用，近似的只重問有差異的條款")
+    parser.add_argument("--similarity-index", default=DEFAULT_SIMILARITY_PATH, help="相似度索引檔案路徑")
+    parser.add_argument("--similarity-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="視為近似文件的相似度門檻（0 ~ 1）")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="以 asyncio 管線同時進行擷取 / OCR、Gemini 分析與寫出結果")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                        help="搭配 --pipeline：擷取 / OCR 的行程數")
+    parser.add_argument("--queue-size", type=int, default=8, help="搭配 --pipeline：各階段之間的佇列長度")
+    parser.add_argument("--queue", metavar="PATH",
+                        help="透過工作佇列處理：檔案先加入佇列再領取，中斷後重跑只處理未完成的檔案，"
+                             "其他電腦也可以用 job_queue.py work 一起處理")
+    parser.add_argument("--trace", nargs="?", const=DEFAULT_TRACE_PATH, metavar="PATH",
+                        help=f"記錄各階段耗時到追蹤檔（JSON Lines，預設 {DEFAULT_TRACE_PATH}）；不加時不記錄")
+    # 舊版預設會記錄，保留 --no-trace 讓既有的指令仍可執行
+    parser.add_argument("--no-trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.pipeline and args.batch:
+        parser.error("--pipeline 目前不支援 --batch")
+    if args.queue and (args.pipeline or args.batch):
+        parser.error("--queue 目前不支援 --pipeline 與 --batch")
+    require_api_key()
+
+    manifest = None if args.full else RunManifest(args.manifest)
+    if args.trace and not args.no_trace:
+        enable_tracing(args.trace)
+
+    # Step 0: 執行 Word→PDF 轉換與 Excel 報告分析
+    print("📁 執行文件分析與 Word → PDF 轉換")
+    try:
+        rpa_result = rpa_main(direct_docx=args.direct_docx, archive_pdf=not args.no_archive_pdf,
+                              manifest=manifest)
+    except Exception as e:
+        print(f"❌ RPA 統合程式執行失敗：{e}")
+        sys.exit(1)
+
+    # Step 1 ~ Step 3: 處理所有 PDF 檔案（--direct-docx 時另外直接處理 .docx）
+    file_paths = []
+    docx_stems = []
+    if args.direct_docx:
+        file_paths = [f for f in rpa_result["analysis"]["all_files"] if f.endswith(".docx")]
+        docx_stems = [os.path.splitext(os.path.basename(f))[0] for f in file_paths]
+    if os.path.isdir(PDF_DIR):
+        file_paths += list_pdfs(PDF_DIR, exclude_stems=docx_stems)
+
+    ctx = BatchContext(
+        limiter=RateLimiter(rpm=args.rpm, tpm=args.tpm),
+        cache=None if args.no_extract_cache else ExtractCache(args.extract_cache),
+        response_cache=None if args.no_response_cache else ResponseCache(
+            args.response_cache, ttl_days=args.response_ttl_days),
+        store=FindingsStore(),
+        manifest=manifest,
+        prefilter=args.prefilter,
+        rules=args.rules,
+        batch=args.batch,
+        similarity=SimilarityIndex(args.similarity_index, threshold=args.similarity_threshold)
+        if args.similar else None,
+        # 工作佇列的 TXT / RESULT 寫在佇列檔所在的資料夾，與其他電腦的 job_queue.py work 一致
+        output_dir=os.path.dirname(os.path.abspath(args.queue)) if args.queue else None,
+    )
+    if args.queue:
+        queue = JobQueue(args.queue)
+        added = queue.enqueue(file_paths)
+        print(f"📥 已加入 {added} 個新的或內容已變更的檔案到工作佇列 {args.queue}")
+        records = run_queue_worker(queue, ctx, threads=args.workers)
+        queue.print_status()
+    elif args.pipeline:
+        from async_pipeline import run_pipeline
+        records = run_pipeline(file_paths, ctx=ctx, extract_workers=args.extract_workers,
+                               analyze_workers=args.workers, queue_size=args.queue_size)
+    else:
+        records = process_files(file_paths, ctx=ctx, workers=args.workers)
+    # 整批結束後才一次產生 Excel 報告；工作佇列時涵蓋所有電腦處理的檔案
+    if args.queue:
+        count = export_queue_report(queue, ctx.result_dir, REPORT_PATH)
+        queue.close()
+    else:
+        count = ctx.store.export_excel(REPORT_PATH)
+    ctx.store.close()
+    print(f"📊 已匯出 {count} 筆疑慮紀錄到 {REPORT_PATH}")
+    if ctx.cache is not None:
+        ctx.cache.close()
+    if ctx.response_cache is not None:
+        ctx.response_cache.close()
+    if ctx.similarity is not None:
+        ctx.similarity.close()
+
+    archive_thread = rpa_result["archive_thread"]
+    if archive_thread is not None and archive_thread.is_alive():
+        print("⏳ 等待背景 PDF 封存完成...")
+        archive_thread.join()
+    if manifest is not None:
+        manifest.close()
+
+    print_summary(records)
+    print_run_summary()
+    disable_tracing()
+    print("✅ 所有檔案處理完畢！")
+    return records
+
 
-print("✅ 所有檔案處理完畢！")
+if __name__ == '__main__':
+    main()
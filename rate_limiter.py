@@ -0,0 +1,163 @@
+# rate_limiter.py
+# 以 token bucket 控制每分鐘請求數 (RPM) 與每分鐘 token 數 (TPM)，
+# 遇到 429 / ResourceExhausted 時以指數退避 + 隨機抖動重試
+import re
+import random
+import threading
+import time
+
+from instrumentation import current_span
+
+DEFAULT_RPM = 15
+DEFAULT_TPM = 1_000_000
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：中文大約一字一個 token，以字元數當作保守估計"""
+    return max(1, len(text))
+
+
+_QUOTA_STATUS = re.compile(r"(?<![\w.])429(?![\w.])")
+_QUOTA_WORDS = re.compile(r"quota|rate|exhausted|too many requests", re.I)
+
+
+def is_quota_error(exc: Exception) -> bool:
+    """判斷例外是否為配額 / 速率限制錯誤 (HTTP 429)"""
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    if getattr(exc, "code", None) == 429:
+        return True
+    # 沒有型別或狀態碼時才看訊息：必須是獨立的 429 且提到配額 / 速率，檔名或金額中的 429 不算
+    message = str(exc)
+    return bool(_QUOTA_STATUS.search(message) and _QUOTA_WORDS.search(message))
+
+
+class TokenBucket:
+    """每分鐘補充 rate_per_minute 個 token 的桶，容量等於一分鐘的量"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.fill_rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """回傳還需要等待幾秒才能取得 amount 個 token（0 表示現在就夠）"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.fill_rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """RPM + TPM 雙桶限流器，可供多個執行緒同時使用"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=6,
+                 base_delay=2.0, max_delay=60.0):
+        self.requests = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self.started = time.monotonic()
+        self.stats = {"requests": 0, "tokens": 0, "quota_errors": 0, "retries": 0, "failures": 0}
+
+    def _try_acquire(self, tokens):
+        """額度足夠時扣除並回傳 0，否則回傳還需要等待的秒數"""
+        with self._lock:
+            wait = max(self._pause_until - time.monotonic(),
+                       self.requests.wait_time(1),
+                       self.token_bucket.wait_time(tokens))
+            if wait <= 0:
+                self.requests.take(1)
+                self.token_bucket.take(tokens)
+                self.stats["requests"] += 1
+                self.stats["tokens"] += tokens
+        return wait
+
+    def acquire(self, tokens=1):
+        """阻塞直到 RPM 與 TPM 兩個桶都有足夠額度"""
+        while (wait := self._try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """acquire 的非同步版本，等待時不佔住事件迴圈"""
+        import asyncio  # 只有非同步流程會用到，呼叫時 asyncio 早已載入
+        while (wait := self._try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, attempt):
+        """計算第 attempt 次重試的等待時間（full jitter），並讓其他執行緒一起暫停"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+        return delay
+
+    def _retry_delay(self, exc, attempt):
+        """配額錯誤且還能重試時回傳退避秒數，否則回傳 None（呼叫端應重新丟出例外）"""
+        if not is_quota_error(exc):
+            return None
+        with self._lock:
+            self.stats["quota_errors"] += 1
+        if attempt >= self.max_retries:
+            with self._lock:
+                self.stats["failures"] += 1
+            return None
+        delay = self.backoff(attempt)
+        with self._lock:
+            self.stats["retries"] += 1
+        current_span().increment("retries")
+        print(f"⏳ 觸發配額限制，{delay:.1f} 秒後重試（第 {attempt + 1} 次）")
+        return delay
+
+    def call(self, func, *args, tokens=1, **kwargs):
+        """在限流下呼叫 func，遇到配額錯誤就退避後重試"""
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if self._retry_delay(e, attempt) is None:
+                    raise
+                attempt += 1
+
+    async def call_async(self, func, *args, tokens=1, **kwargs):
+        """call 的非同步版本；func 為 async 函式（例如 generate_content_async）"""
+        attempt = 0
+        while True:
+            await self.acquire_async(tokens)
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if self._retry_delay(e, attempt) is None:
+                    raise
+                attempt += 1
+
+    def throughput(self):
+        """回傳目前為止的實際吞吐量：每分鐘請求數與每分鐘 token 數"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "elapsed_seconds": elapsed,
+            "requests_per_minute": self.stats["requests"] * 60.0 / elapsed,
+            "tokens_per_minute": self.stats["tokens"] * 60.0 / elapsed,
+            **self.stats,
+        }
+
+    def print_summary(self):
+        t = self.throughput()
+        print("\n=== Gemini 呼叫吞吐量 ===")
+        print(f"耗時 {t['elapsed_seconds']:.1f} 秒，共 {t['requests']} 次請求、約 {t['tokens']} tokens")
+        print(f"實際吞吐量：{t['requests_per_minute']:.1f} 請求/分鐘、{t['tokens_per_minute']:.0f} tokens/分鐘")
+        print(f"配額錯誤 {t['quota_errors']} 次，重試 {t['retries']} 次，放棄 {t['failures']} 次")
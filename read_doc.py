@@ -1,43 +1,572 @@
 import os
-from PyPDF2 import PdfReader
-from docx import Document
-from pdf2image import convert_from_path
-import pytesseract
+import re
+import atexit
+import zipfile
+import functools
+import threading
+from collections import namedtuple
+# PyPDF2、python-docx、pdf2image、pytesseract 只在實際擷取時才載入，匯入這個模組（或 --help）不必等它們
+from extract_cache import make_key
+from instrumentation import (span, traced, tracing_enabled, init_worker_tracing, collect_worker_spans,
+                             merge_worker_spans)
 
-def read_text_from_file(file_path):
+# OCR 設定（也是擷取快取鍵的一部分，改了設定就不會用到舊結果）
+OCR_LANG = 'chi_sim+eng'  # 中文+英文 OCR
+# 頁面轉成影像的解析度；'auto' 時從 OCR_AUTO_DPIS 最低的開始，信心不足 OCR_MIN_CONFIDENCE 的頁面才用下一個解析度重做
+OCR_DPI = 200
+OCR_AUTO_DPIS = (150, 200, 300)
+OCR_MIN_CONFIDENCE = 75
+# 'rgb'：彩色；'gray'：灰階（像素資料只有彩色的 1/3）；'binary'：灰階後以 Otsu 門檻轉成黑白
+OCR_COLOR = 'gray'
+# 自動校正掃描歪斜（最多 ±OCR_MAX_SKEW 度）；裁掉頁面四周的空白
+OCR_DESKEW = False
+OCR_MAX_SKEW = 5
+OCR_CROP_MARGINS = True
+OCR_CROP_PADDING = 16
+# 'tesserocr'：每個行程常駐一個 tesseract 引擎，語言模型只載入一次，頁面影像直接在記憶體中傳入
+# 'pytesseract'：每頁啟動一次 tesseract 執行檔；'auto'：有安裝 tesserocr 就用，否則用 pytesseract
+OCR_BACKEND = 'auto'
+# 平行 OCR：每個行程一次只轉換 OCR_PAGE_WINDOW 頁，
+# 記憶體中同時最多只有 OCR_WORKERS × OCR_PAGE_WINDOW 張頁面影像，與文件長度無關
+OCR_WORKERS = os.cpu_count() or 1
+OCR_PAGE_WINDOW = 2
+
+# Word 擷取方式：'xml' 直接從 zip 逐步解析 word/document.xml 與頁首、頁尾，包含表格（金額、稅額、帳戶常在表格中）；
+# 'python-docx'：建立完整的物件模型，只讀內文段落（舊方式）
+DOCX_EXTRACTOR = 'xml'
+
+# 逐頁判斷是否需要 OCR：可用字元太少或亂碼比例太高的頁面才 OCR
+MIN_PAGE_CHARS = 20
+MAX_GARBLED_RATIO = 0.05
+
+# 串流擷取的單位：PDF 為一頁（number 為頁碼），Word 為一段或表格的一列（number 為序號），都從 1 開始；
+# kind 為 'page'、'paragraph'、'table_row'、'header' 或 'footer'，
+# offset 為這段文字在完整文字中的起始位置，method 為 'text'、'ocr' 或 'docx'
+TextChunk = namedtuple("TextChunk", "kind number offset text method")
+
+_ocr_pool = None
+# 佇列工作者等多個執行緒可能同時第一次 OCR，建立行程池時要上鎖，否則會建立多個行程池
+_ocr_pool_lock = threading.Lock()
+_tesserocr_local = threading.local()
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# 相容內容（mc:AlternateContent）的備用版本與主要版本文字相同，只讀主要版本
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_DOCX_BREAKS = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n"}
+
+def extractor_settings(file_path=None):
+    """回傳會影響擷取結果的設定，用於擷取快取的鍵
+
+    指定檔案時只回傳與該檔案類型有關的設定：改了 Word 擷取方式不會讓 PDF 重新 OCR，反之亦然
+    """
+    docx = {"docx_extractor": DOCX_EXTRACTOR}
+    if file_path is not None and os.path.splitext(file_path)[1].lower() == '.docx':
+        return docx
+    pdf = {"ocr_lang": OCR_LANG, "ocr_backend": ocr_backend(), **raster_options(),
+           "pdf_mode": "hybrid", "min_page_chars": MIN_PAGE_CHARS,
+           "max_garbled_ratio": MAX_GARBLED_RATIO}
+    return pdf if file_path is not None else {**pdf, **docx}
+
+def read_text_from_file(file_path, cache=None):
+    text, _ = read_text_with_method(file_path, cache=cache)
+    return text
+
+def read_text_with_method(file_path, cache=None, executor=None, file_hash=None):
+    """讀取檔案文字，回傳 (文字, 擷取方式)
+
+    擷取方式為 'text'、'ocr'、'docx'，或部分頁面 OCR 時的 'mixed(ocr: 3, 5-6)'
+
+    cache 為 extract_cache.ExtractCache；檔案內容與設定都沒變時直接回傳快取結果
+    executor 為 create_extract_pool() 建立的行程池；有傳入時實際擷取在子行程中進行
+    file_hash 為執行清單已算好的檔案雜湊，快取鍵直接使用，不必再讀一次檔案
+    """
+    if cache is not None:
+        key = make_key(file_path, extractor_settings(file_path), file_hash=file_hash)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    if executor is not None:
+        text, method, spans = executor.submit(_read_text_in_worker, file_path).result()
+        merge_worker_spans(spans)
+    else:
+        text, method = _read_text_with_method(file_path)
+    if cache is not None:
+        cache.put(key, file_path, text, method)
+    return text, method
+
+def _read_text_in_worker(file_path):
+    """在擷取行程中執行，連同子行程記下的 span（read_pdf、ocr_pdf、read_docx）一起回傳"""
+    text, method = _read_text_with_method(file_path)
+    return text, method, collect_worker_spans()
+
+def _read_text_with_method(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        text, page_methods = read_pdf_hybrid(file_path)
+        ocr_pages_numbers = [i + 1 for i, m in enumerate(page_methods) if m == 'ocr']
+        if not ocr_pages_numbers:
+            return text, 'text'
+        if len(ocr_pages_numbers) == len(page_methods):
+            return text, 'ocr'
+        return text, f"mixed(ocr: {format_page_ranges(ocr_pages_numbers)})"
+    elif ext == '.docx':
+        return read_docx(file_path), 'docx'
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+def iter_text(file_path):
+    """逐頁（PDF）或逐段（Word）產生 TextChunk，把所有 chunk.text 接起來就是 read_text_from_file 的結果
+
+    記憶體中只保留目前這一頁或這一段（加上等待 OCR 的少數頁面），呼叫端找到需要的條款後可以直接停止迭代；
+    不經過擷取快取
+    """
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.pdf':
-        text = read_pdf(file_path)
-        if not text.strip():
-            print(f"⚠️ PDF {file_path} 沒有文字層，使用 OCR 處理...")
-            text = ocr_pdf(file_path)
-        return text
+        return iter_pdf_pages(file_path)
     elif ext == '.docx':
-        return read_docx(file_path)
+        return iter_docx(file_path)
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
+@traced("read_pdf")
 def read_pdf(file_path):
+    from PyPDF2 import PdfReader
     reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text
-    return text
+    return "".join(page.extract_text() or "" for page in reader.pages)
+
+def _is_garbled_char(ch):
+    """控制字元、Latin-1 補充、私用區與替代字元：中文合約裡出現通常代表字型對應錯誤"""
+    code = ord(ch)
+    return (code < 0x20 or 0x7f <= code <= 0xff or 0xe000 <= code <= 0xf8ff
+            or ch == '\ufffd')
+
+def is_usable_page_text(page_text):
+    """判斷一頁的文字層是否可用：字數足夠且亂碼比例不高"""
+    chars = "".join(page_text.split())
+    if len(chars) < MIN_PAGE_CHARS:
+        return False
+    garbled = sum(1 for ch in chars if _is_garbled_char(ch))
+    return garbled / len(chars) <= MAX_GARBLED_RATIO
+
+def format_page_ranges(page_numbers):
+    """[3, 5, 6, 7] → '3, 5-7'"""
+    ranges = []
+    for n in page_numbers:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+def iter_pdf_pages(file_path):
+    """逐頁產生 TextChunk：有可用文字層的頁面直接用，其餘頁面才轉成影像 OCR
+
+    連續需要 OCR 的頁面會累積到 OCR_WORKERS × OCR_PAGE_WINDOW 頁再一起平行 OCR，
+    遇到有文字層的頁面時先把累積的頁面處理完，輸出順序與原文件相同
+    """
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    pending = []
+    offset = 0
+
+    def flush():
+        nonlocal offset
+        print(f"⚠️ PDF {file_path} 第 {format_page_ranges(pending)} 頁沒有可用文字層，使用 OCR 處理...")
+        for number, page_text in zip(pending, ocr_pages(file_path, pending)):
+            yield TextChunk('page', number, offset, page_text, 'ocr')
+            offset += len(page_text)
+        pending.clear()
+
+    for number, page in enumerate(reader.pages, 1):
+        page_text = page.extract_text() or ""
+        if not is_usable_page_text(page_text):
+            pending.append(number)
+            if len(pending) >= OCR_WORKERS * OCR_PAGE_WINDOW:
+                yield from flush()
+            continue
+        if pending:
+            yield from flush()
+        yield TextChunk('page', number, offset, page_text, 'text')
+        offset += len(page_text)
+    if pending:
+        yield from flush()
+
+def read_pdf_hybrid(file_path):
+    """iter_pdf_pages 的字串版本，回傳 (文字, 每頁擷取方式清單)，例如 ['text', 'ocr', 'text']"""
+    with span("read_pdf", file=file_path) as s:
+        parts, page_methods = [], []
+        for chunk in iter_pdf_pages(file_path):
+            parts.append(chunk.text)
+            page_methods.append(chunk.method)
+        text = "".join(parts)
+        s.set(pages=len(page_methods), characters=len(text))
+    return text, page_methods
+
+def _get_ocr_pool():
+    """整批處理共用同一個 OCR 行程池，避免每份文件都重新啟動行程"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            # OCR 子行程內沒有 span，ocr_pdf 由父行程記錄；停用追蹤以免寫到繼承來的追蹤檔
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=init_worker_tracing,
+                                            initargs=(False,))
+        return _ocr_pool
+
+@atexit.register
+def shutdown_ocr_pool():
+    global _ocr_pool
+    with _ocr_pool_lock:
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _init_extract_worker(tracing):
+    """擷取行程內直接 OCR，不再各自開 OCR 行程池，總行程數才不會變成 擷取行程數 × OCR_WORKERS；
+    啟用追蹤時 span 先留在子行程，隨擷取結果交回父行程寫入（fork 與 spawn 都一樣）"""
+    global OCR_WORKERS
+    OCR_WORKERS = 1
+    init_worker_tracing(tracing)
+
+def create_extract_pool(workers):
+    """建立整份文件擷取用的行程池（每個行程一次處理一份文件）；須在 enable_tracing() 之後建立"""
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker,
+                               initargs=(tracing_enabled(),))
+
+def ocr_backend():
+    """回傳實際使用的 OCR 後端名稱"""
+    if OCR_BACKEND != 'auto':
+        return OCR_BACKEND
+    return _auto_ocr_backend()
+
+@functools.lru_cache(maxsize=None)
+def _auto_ocr_backend():
+    # 每個檔案（extractor_settings）與每一頁（ocr_image）都會呼叫；沒有安裝 tesserocr 時，
+    # 每次 import 失敗都要重新搜尋 sys.path，所以只判斷一次
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return 'pytesseract'
+    return 'tesserocr'
+
+def ocr_backend_available(backend):
+    """檢查指定的 OCR 後端是否能在這台電腦上使用"""
+    if backend == 'tesserocr':
+        try:
+            import tesserocr  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except (pytesseract.TesseractNotFoundError, OSError):
+        return False
+    return True
+
+def _tesserocr_api(lang):
+    """每個執行緒各自保留一個 PyTessBaseAPI（不能跨執行緒共用），整個行程存活期間重複使用"""
+    apis = getattr(_tesserocr_local, "apis", None)
+    if apis is None:
+        apis = _tesserocr_local.apis = {}
+    if lang not in apis:
+        import tesserocr
+        apis[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+    return apis[lang]
+
+def ocr_image(image, backend=None, confidence=False):
+    """OCR 一張頁面影像，回傳 (文字, 平均信心 0~100)
+
+    pytesseract 後端只有在 confidence=True 時才改用 image_to_data 計算信心，否則信心為 None
+    """
+    backend = backend or ocr_backend()
+    if backend == 'tesserocr':
+        api = _tesserocr_api(OCR_LANG)
+        api.SetImage(image)
+        return api.GetUTF8Text(), api.MeanTextConf()
+    import pytesseract
+    if not confidence:
+        return pytesseract.image_to_string(image, lang=OCR_LANG), None
+    data = pytesseract.image_to_data(image, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+    lines, confidences = {}, []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0:
+            continue  # 區塊 / 段落 / 行本身的紀錄，不是文字
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        if word.strip():
+            confidences.append(conf)
+    text = "".join(" ".join(words) + "\n" for words in lines.values())
+    return text, sum(confidences) / len(confidences) if confidences else 0.0
+
+def raster_options():
+    """頁面轉影像與前處理的設定；由父行程傳給 OCR 子行程，也是擷取快取鍵的一部分"""
+    return {"ocr_dpi": OCR_DPI, "ocr_auto_dpis": list(OCR_AUTO_DPIS) if OCR_DPI == 'auto' else None,
+            "ocr_min_confidence": OCR_MIN_CONFIDENCE if OCR_DPI == 'auto' else None,
+            "ocr_color": OCR_COLOR, "ocr_deskew": OCR_DESKEW, "ocr_crop_margins": OCR_CROP_MARGINS}
+
+def _ink_mask(gray):
+    """深色像素為 255、其餘為 0 的遮罩，並去掉零星的掃描雜點"""
+    from PIL import ImageFilter
+    return gray.point(lambda v: 255 if v < 128 else 0).filter(ImageFilter.MedianFilter(3))
+
+def crop_margins(image, padding=OCR_CROP_PADDING):
+    """裁掉頁面四周沒有文字的空白，保留 padding 像素的邊；整頁空白時原樣回傳"""
+    gray = image if image.mode == 'L' else image.convert('L')
+    bbox = _ink_mask(gray).getbbox()
+    if bbox is None:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((max(left - padding, 0), max(top - padding, 0),
+                       min(right + padding, image.width), min(bottom + padding, image.height)))
+
+def estimate_skew(image, max_angle=OCR_MAX_SKEW):
+    """以水平投影估計歪斜角度（度）：轉到正確角度時，文字行與行距的投影對比最強烈"""
+    import numpy as np
+    gray = image if image.mode == 'L' else image.convert('L')
+    scale = min(1.0, 1000 / max(gray.width, 1))
+    mask = _ink_mask(gray.resize((max(int(gray.width * scale), 1), max(int(gray.height * scale), 1))))
+
+    def score(angle):
+        rows = np.asarray(mask.rotate(angle, fillcolor=0), dtype=np.float64).sum(axis=1)
+        return float(np.sum(np.diff(rows) ** 2))
+
+    # 先以 1 度粗找，再在最佳角度附近以 0.1 度細找
+    best = max(np.arange(-max_angle, max_angle + 0.5, 1.0), key=score)
+    best = max(np.arange(best - 1.0, best + 1.05, 0.1), key=score)
+    return round(float(best), 1)
+
+def deskew(image, max_angle=OCR_MAX_SKEW):
+    """把歪斜的掃描頁轉正；角度小於 0.1 度時原樣回傳"""
+    from PIL import Image
+    angle = estimate_skew(image, max_angle)
+    if abs(angle) < 0.1:
+        return image
+    fill = 255 if image.mode in ('L', '1') else (255,) * len(image.getbands())
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+def binarize(image):
+    """以 Otsu 法自動選門檻，轉成只有黑白兩色的灰階影像"""
+    gray = image if image.mode == 'L' else image.convert('L')
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    weight_bg = sum_bg = 0
+    best_threshold, best_variance = 127, -1.0
+    for t, h in enumerate(histogram):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * h
+        mean_bg, mean_fg = sum_bg / weight_bg, (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = t, variance
+    return gray.point(lambda v: 255 if v > best_threshold else 0)
+
+def prepare_page(image, options):
+    """依 raster_options() 的設定處理一張頁面影像：灰階 → 裁邊 → 轉正 → 二值化"""
+    if options["ocr_color"] != 'rgb' and image.mode != 'L':
+        image = image.convert('L')
+    if options["ocr_crop_margins"]:
+        image = crop_margins(image)
+    if options["ocr_deskew"]:
+        image = deskew(image)
+    if options["ocr_color"] == 'binary':
+        image = binarize(image)
+    return image
+
+def _rasterize(file_path, first_page, last_page, dpi, options):
+    # 直接以灰階轉換，pdftoppm 輸出與記憶體中的影像都只有單一色版
+    from pdf2image import convert_from_path
+    return convert_from_path(file_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                             grayscale=options["ocr_color"] != 'rgb')
+
+def _ocr_page_window(args):
+    """在子行程中只轉換 first_page ~ last_page 這幾頁並 OCR，回傳每頁 (文字, 信心) 的清單
+
+    後端名稱與轉影像設定由父行程傳入，子行程以 spawn 啟動時才會與父行程一致；
+    自動解析度時先以最低解析度轉換整個區段，信心不足的頁面才逐頁以較高解析度重做
+    """
+    file_path, first_page, last_page, backend, options = args
+    dpis = options["ocr_auto_dpis"] or [options["ocr_dpi"]]
+    need_confidence = len(dpis) > 1
+    pages = []
+    images = _rasterize(file_path, first_page, last_page, dpis[0], options)
+    for page_number, image in enumerate(images, first_page):
+        text, conf = ocr_image(prepare_page(image, options), backend, need_confidence)
+        for dpi in dpis[1:]:
+            if not text.strip() or conf >= options["ocr_min_confidence"]:
+                break  # 空白頁提高解析度也沒有用
+            image = _rasterize(file_path, page_number, page_number, dpi, options)[0]
+            retry_text, retry_conf = ocr_image(prepare_page(image, options), backend, True)
+            if retry_conf >= conf:
+                text, conf = retry_text, retry_conf
+        pages.append((text, conf))
+    return pages
+
+def ocr_pages(file_path, page_numbers):
+    """OCR 指定的頁面（從 1 開始），回傳與 page_numbers 順序相同的文字清單"""
+    return [text for text, _ in ocr_pages_with_confidence(file_path, page_numbers)]
+
+def ocr_pages_with_confidence(file_path, page_numbers):
+    """與 ocr_pages 相同，但回傳每頁的 (文字, 信心)；信心無法取得時為 None"""
+    # 連續的頁碼合併成最多 OCR_PAGE_WINDOW 頁的區段，一次轉換一個區段
+    windows = []
+    for n in page_numbers:
+        if windows and n == windows[-1][2] + 1 and n - windows[-1][1] < OCR_PAGE_WINDOW:
+            windows[-1][2] = n
+        else:
+            windows.append([file_path, n, n])
+    backend, options = ocr_backend(), raster_options()
+    windows = [(path, first, last, backend, options) for path, first, last in windows]
+    with span("ocr_pdf", file=file_path, pages=len(page_numbers), backend=backend) as s:
+        if OCR_WORKERS <= 1 or len(windows) == 1:
+            results = map(_ocr_page_window, windows)
+        else:
+            # executor.map 依提交順序回傳，輸出的頁面順序與原文件相同
+            results = _get_ocr_pool().map(_ocr_page_window, windows)
+        pages = [page for window_pages in results for page in window_pages]
+        confidences = [conf for _, conf in pages if conf is not None]
+        s.set(characters=sum(len(text) for text, _ in pages),
+              confidence=round(sum(confidences) / len(confidences), 1) if confidences else None)
+    return pages
 
 def ocr_pdf(file_path):
-    images = convert_from_path(file_path)
-    text = ""
-    for img in images:
-        text += pytesseract.image_to_string(img, lang='chi_sim+eng')  # 中文+英文 OCR
-    return text
+    from pdf2image import pdfinfo_from_path
+    page_count = pdfinfo_from_path(file_path)["Pages"]
+    return "".join(ocr_pages(file_path, range(1, page_count + 1)))
 
-def read_docx(file_path):
+def iter_docx_paragraphs(file_path):
+    """逐段產生 TextChunk，每段文字以換行結尾"""
+    from docx import Document
     doc = Document(file_path)
-    text = ""
-    for para in doc.paragraphs:
-        text += para.text + "\n"
+    offset = 0
+    for number, para in enumerate(doc.paragraphs, 1):
+        para_text = para.text + "\n"
+        yield TextChunk('paragraph', number, offset, para_text, 'docx')
+        offset += len(para_text)
+
+def _iterparse(source):
+    """有安裝 lxml 就用 lxml 的 iterparse（較快），否則用標準函式庫的 ElementTree"""
+    try:
+        from lxml.etree import iterparse
+    except ImportError:
+        from xml.etree.ElementTree import iterparse
+    return iterparse(source, events=("start", "end"))
+
+def iter_docx_xml_blocks(source):
+    """逐步解析一個 WordprocessingML 檔案（document.xml、header1.xml…），依原文順序產生 (kind, 文字)
+
+    kind 為 'paragraph' 或 'table_row'：表格每列一筆，儲存格之間以 tab 分隔，儲存格內的多個段落以空格連接；
+    巢狀表格併入外層儲存格，文字方塊中的段落併入所在段落。處理完的段落與表格列立即從樹中移除，
+    記憶體中只保留目前這一段
+    """
+    stack = []
+    parts = []
+    cells = cell = None
+    paragraph_depth = table_depth = fallback_depth = 0
+    for event, elem in _iterparse(source):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag == _W + "p":
+                paragraph_depth += 1
+            elif tag == _W + "tbl":
+                table_depth += 1
+            elif tag == _MC_FALLBACK:
+                fallback_depth += 1
+            elif table_depth == 1 and not paragraph_depth:
+                if tag == _W + "tr":
+                    cells = []
+                elif tag == _W + "tc":
+                    cell = []
+            continue
+
+        stack.pop()
+        if tag == _W + "t":
+            if not fallback_depth:
+                parts.append(elem.text or "")
+        elif tag in _DOCX_BREAKS:
+            # 只有文字段（w:r）中的 tab / 換行才是內容；w:pPr/w:tabs 底下的 w:tab 是定位點設定
+            if not fallback_depth and stack and stack[-1].tag == _W + "r":
+                parts.append(_DOCX_BREAKS[tag])
+        elif tag == _MC_FALLBACK:
+            fallback_depth -= 1
+        elif tag == _W + "p":
+            paragraph_depth -= 1
+            if paragraph_depth:
+                parts.append(" ")
+                continue
+            text = "".join(parts).strip(" ") if table_depth else "".join(parts)
+            parts = []
+            if not table_depth:
+                yield 'paragraph', text
+            elif cell is not None and text:
+                cell.append(text)
+        elif tag == _W + "tbl":
+            table_depth -= 1
+        elif table_depth == 1 and not paragraph_depth and tag == _W + "tc":
+            cells.append(" ".join(cell))
+            cell = None
+        elif table_depth == 1 and not paragraph_depth and tag == _W + "tr":
+            yield 'table_row', "\t".join(cells)
+            cells = None
+        else:
+            continue
+
+        # 內文的段落、表格與最外層表格的列處理完就從父元素移除
+        if stack and not paragraph_depth and (table_depth == 0 or tag == _W + "tr" and table_depth == 1):
+            stack[-1].remove(elem)
+
+def _docx_parts(zf, prefix):
+    """word/header1.xml、word/header2.xml…，依編號排序"""
+    pattern = re.compile(rf"word/{prefix}(\d*)\.xml")
+    numbered = []
+    for name in zf.namelist():
+        match = pattern.fullmatch(name)
+        if match:
+            numbered.append((int(match.group(1) or 0), name))
+    return [name for _, name in sorted(numbered)]
+
+def iter_docx_blocks(file_path):
+    """不建立 python-docx 物件模型，直接從 zip 依序產生頁首、內文（段落與表格列依原文順序）、頁尾的 TextChunk
+
+    空白的頁首 / 頁尾段落略過，重複出現的頁首 / 頁尾文字（首頁、奇偶頁常相同）只輸出一次
+    """
+    offset = 0
+    number = 0
+    seen = set()
+    with zipfile.ZipFile(file_path) as zf:
+        parts = ([("header", name) for name in _docx_parts(zf, "header")] + [("body", "word/document.xml")]
+                 + [("footer", name) for name in _docx_parts(zf, "footer")])
+        for part, name in parts:
+            with zf.open(name) as f:
+                for kind, text in iter_docx_xml_blocks(f):
+                    if part != "body":
+                        if not text.strip() or text in seen:
+                            continue
+                        seen.add(text)
+                        kind = part
+                    number += 1
+                    text += "\n"
+                    yield TextChunk(kind, number, offset, text, 'docx')
+                    offset += len(text)
+
+def iter_docx(file_path):
+    """依 DOCX_EXTRACTOR 選擇 Word 的串流擷取方式"""
+    if DOCX_EXTRACTOR == 'python-docx':
+        return iter_docx_paragraphs(file_path)
+    return iter_docx_blocks(file_path)
+
+def read_docx(file_path):
+    with span("read_docx", file=file_path) as s:
+        text = "".join(chunk.text for chunk in iter_docx(file_path))
+        s.set(characters=len(text))
     return text
 
 if __name__ == '__main__':
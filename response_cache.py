@@ -0,0 +1,168 @@
+# response_cache.py
+# 把 Gemini 的回應存在本機 SQLite：同一份文字、同一個提示模板、同一個模型與生成設定
+# 在有效期限內不再重複呼叫 API
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = "response_cache.sqlite"
+DEFAULT_TTL_DAYS = 30
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(template, model_name, generation_config, text):
+    """快取鍵 = 提示模板、模型名稱、生成設定、輸入文字各自雜湊後再合併雜湊"""
+    parts = [
+        _sha256(template),
+        _sha256(model_name),
+        _sha256(json.dumps(generation_config or {}, sort_keys=True)),
+        _sha256(text),
+    ]
+    return _sha256("|".join(parts))
+
+
+class ResponseCache:
+    """有有效期限 (TTL) 的 Gemini 回應快取，並記錄每次執行的命中 / 未命中次數"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_days=DEFAULT_TTL_DAYS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400 if ttl_days is not None else None
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                template_hash TEXT,
+                response TEXT,
+                created REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                started REAL,
+                finished REAL,
+                hits INTEGER,
+                misses INTEGER
+            )
+        """)
+        self.conn.commit()
+        self.started = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """回傳快取的回應文字，沒有或已過期時回傳 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model_name, template, response):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, _sha256(template), response, time.time()))
+            self.conn.commit()
+
+    def invalidate(self, model_name=None, template=None, older_than_days=None):
+        """刪除符合條件的快取；條件都沒給時全部刪除，回傳刪除筆數"""
+        conditions, params = [], []
+        if model_name is not None:
+            conditions.append("model = ?")
+            params.append(model_name)
+        if template is not None:
+            conditions.append("template_hash = ?")
+            params.append(_sha256(template))
+        if older_than_days is not None:
+            conditions.append("created < ?")
+            params.append(time.time() - older_than_days * 86400)
+        sql = "DELETE FROM responses"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            removed = self.conn.execute(sql, params).rowcount
+            self.conn.commit()
+        return removed
+
+    def purge_expired(self):
+        if self.ttl_seconds is None:
+            return 0
+        return self.invalidate(older_than_days=self.ttl_seconds / 86400)
+
+    def recent_runs(self, limit=10):
+        return self.conn.execute(
+            "SELECT started, finished, hits, misses FROM runs ORDER BY started DESC LIMIT ?",
+            (limit,)).fetchall()
+
+    def print_summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        print(f"📦 回應快取：命中 {self.hits} 次，未命中 {self.misses} 次（命中率 {rate:.0f}%）")
+
+    def close(self):
+        """記錄本次執行的命中 / 未命中次數後關閉"""
+        with self._lock:
+            if self.hits or self.misses:
+                self.conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?)",
+                                  (self.started, time.time(), self.hits, self.misses))
+                self.conn.commit()
+            self.conn.close()
+
+
+def _format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="檢視與失效 Gemini 回應快取")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH, help="快取檔案路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="顯示快取筆數與最近幾次執行的命中率")
+    inv = sub.add_parser("invalidate", help="刪除快取（未指定條件時全部刪除）")
+    inv.add_argument("--model", help="只刪除此模型的回應")
+    inv.add_argument("--current-template", action="store_true",
+                     help="只刪除使用目前 ask_gemini.PROMPT_TEMPLATE 的回應")
+    inv.add_argument("--older-than-days", type=float, help="只刪除超過指定天數的回應")
+    purge = sub.add_parser("purge-expired", help="刪除超過有效期限的回應")
+    purge.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到快取檔案：{args.path}")
+        sys.exit(1)
+
+    if args.command == "purge-expired":
+        cache = ResponseCache(args.path, ttl_days=args.ttl_days)
+        print(f"🧹 已刪除 {cache.purge_expired()} 筆過期回應")
+    else:
+        cache = ResponseCache(args.path)
+    if args.command == "stats":
+        count = cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        print(f"快取檔案：{args.path}，共 {count} 筆回應")
+        for model, n in cache.conn.execute("SELECT model, COUNT(*) FROM responses GROUP BY model"):
+            print(f"  {model}: {n} 筆")
+        print("最近幾次執行：")
+        for started, finished, hits, misses in cache.recent_runs():
+            print(f"  {_format_time(started)}  命中 {hits}，未命中 {misses}")
+    elif args.command == "invalidate":
+        template = None
+        if args.current_template:
+            from ask_gemini import PROMPT_TEMPLATE as template
+        removed = cache.invalidate(model_name=args.model, template=template,
+                                   older_than_days=args.older_than_days)
+        print(f"🧹 已刪除 {removed} 筆回應")
+    cache.close()
@@ -0,0 +1,142 @@
+# run_manifest.py
+# 記錄每個輸入檔的路徑、大小、修改時間與內容雜湊，以及各階段（掃描、PDF、TXT、RESULT、報告）
+# 已產生的結果；下次執行時只重做內容有變的檔案與其下游階段
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from extract_cache import file_sha256
+
+DEFAULT_MANIFEST_PATH = "run_manifest.sqlite"
+# 依上下游順序排列；上游重做時，下游的指紋也會跟著改變
+STAGES = ("scan", "pdf", "txt", "result", "report")
+
+
+def config_fingerprint(file_hash, config):
+    """階段指紋 = 檔案內容雜湊 + 會影響此階段結果的設定雜湊"""
+    config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{file_hash}:{config_hash[:16]}"
+
+
+class RunManifest:
+    """持久化的執行清單，可供多個執行緒同時使用"""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                sha256 TEXT,
+                updated REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS stages (
+                path TEXT,
+                stage TEXT,
+                fingerprint TEXT,
+                output TEXT,
+                output_path TEXT,
+                updated REAL,
+                PRIMARY KEY (path, stage)
+            )
+        """)
+        self.conn.commit()
+        self.skipped = 0
+
+    def file_hash(self, path):
+        """回傳檔案內容雜湊；大小與修改時間都沒變時直接用記錄中的雜湊，不重新讀檔"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime:
+            return row[2]
+        sha = file_sha256(path)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                              (path, st.st_size, st.st_mtime, sha, time.time()))
+            self.conn.commit()
+        return sha
+
+    @staticmethod
+    def file_signature(path):
+        """以大小與修改時間當作指紋，不讀取檔案內容；用於比讀檔雜湊還便宜的階段（例如圖片掃描）"""
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime}"
+
+    def get(self, path, stage, fingerprint):
+        """階段結果仍有效時回傳記錄的 output，否則回傳 None
+
+        有效 = 指紋相同，且若有輸出檔，輸出檔仍存在
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT fingerprint, output, output_path FROM stages WHERE path = ? AND stage = ?",
+                (os.path.abspath(path), stage)).fetchone()
+        if row is None or row[0] != fingerprint:
+            return None
+        if row[2] and not os.path.exists(row[2]):
+            return None
+        return row[1] if row[1] is not None else ""
+
+    def is_done(self, path, stage, fingerprint):
+        return self.get(path, stage, fingerprint) is not None
+
+    def mark_done(self, path, stage, fingerprint, output=None, output_path=None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(path), stage, fingerprint, output,
+                 os.path.abspath(output_path) if output_path else None, time.time()))
+            self.conn.commit()
+
+    def forget(self, path):
+        with self._lock:
+            self.conn.execute("DELETE FROM stages WHERE path = ?", (os.path.abspath(path),))
+            self.conn.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+            self.conn.commit()
+
+    def stage_counts(self):
+        with self._lock:
+            return dict(self.conn.execute("SELECT stage, COUNT(*) FROM stages GROUP BY stage").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="檢視或清除執行清單")
+    parser.add_argument("--path", default=DEFAULT_MANIFEST_PATH, help="執行清單檔案路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="顯示各階段已完成的檔案數")
+    forget_parser = sub.add_parser("forget", help="清除指定檔案的紀錄，下次執行會重新處理")
+    forget_parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到執行清單：{args.path}")
+        sys.exit(1)
+
+    manifest = RunManifest(args.path)
+    if args.command == "stats":
+        counts = manifest.stage_counts()
+        for stage in STAGES:
+            print(f"{stage:<7} {counts.get(stage, 0)} 個檔案")
+    elif args.command == "forget":
+        for f in args.files:
+            manifest.forget(f)
+        print(f"🧹 已清除 {len(args.files)} 個檔案的紀錄")
+    manifest.close()
@@ -0,0 +1,294 @@
+# similarity_index.py
+# 同一份框架合約換個客戶重簽時，文字幾乎完全相同：以字元 shingle 的 MinHash 簽章建立相似度索引，
+# 找出已分析過的近似文件；完全相同的文字直接沿用結果，近似的文件只把有差異的條款重新分析
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from clause_filter import FIELD_PATTERNS, NEIGHBORS, MAX_COMPACT_CHARS, split_clauses
+
+DEFAULT_INDEX_PATH = "similarity_index.sqlite"
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16  # LSH：簽章分成 16 段、每段 4 個值，任一段完全相同就列為候選
+# 估計的 Jaccard 相似度達到此門檻才視為近似文件
+SIMILARITY_THRESHOLD = 0.8
+# 有差異的條款超過此比例時，重新分析全文比較可靠
+MAX_CHANGED_RATIO = 0.3
+
+# clause_filter 的欄位 → 受影響的題號（需方換了，需方賬戶也要重問）
+FIELD_QUESTIONS = {
+    "buyer": (1, 4),
+    "amount": (2,),
+    "tax": (2,),
+    "payment": (3, 6),
+    "account": (4,),
+    "invoice": (5,),
+    "deadline": (6,),
+}
+ALL_QUESTIONS = sorted({q for questions in FIELD_QUESTIONS.values() for q in questions})
+
+_WHITESPACE = re.compile(r"\s+")
+_MASK_SEED = hashlib.sha256(b"similarity_index").digest()
+# 以一個 64 位元雜湊分別 XOR 不同的遮罩，當作 NUM_PERM 個雜湊函式
+_MASKS = [int.from_bytes(hashlib.sha256(_MASK_SEED + i.to_bytes(2, "big")).digest()[:8], "big")
+          for i in range(NUM_PERM)]
+
+
+def similarity_settings(threshold=SIMILARITY_THRESHOLD):
+    """會影響比對結果的設定，用於執行清單的指紋；threshold 為實際使用的門檻（SimilarityIndex.threshold）"""
+    return {"shingle": SHINGLE_SIZE, "perm": NUM_PERM, "bands": BANDS,
+            "threshold": threshold, "max_changed": MAX_CHANGED_RATIO}
+
+
+def normalize(text):
+    """去掉所有空白；擷取方式不同（換行、空格）不影響比對"""
+    return _WHITESPACE.sub("", text)
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(text, shingle_size=SHINGLE_SIZE):
+    """回傳 NUM_PERM 個值的 MinHash 簽章；文字短於一個 shingle 時以整段文字當作唯一的 shingle"""
+    text = normalize(text)
+    shingles = {text[i:i + shingle_size] for i in range(max(len(text) - shingle_size + 1, 1))}
+    hashes = [_hash64(s) for s in shingles]
+    return [min(h ^ mask for h in hashes) for mask in _MASKS]
+
+
+def estimate_similarity(a, b):
+    """兩個簽章相同位置相等的比例 ≈ 兩份文字 shingle 集合的 Jaccard 相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _band_keys(signature):
+    rows = len(signature) // BANDS
+    return [hashlib.sha1(json.dumps(signature[i * rows:(i + 1) * rows]).encode()).hexdigest()[:16]
+            for i in range(BANDS)]
+
+
+def clause_fields(clause):
+    return sorted(name for name, pattern in FIELD_PATTERNS.items() if pattern.search(clause))
+
+
+def clause_digest(clause):
+    return hashlib.sha1(normalize(clause).encode("utf-8")).hexdigest()[:16]
+
+
+class Match:
+    """find() 的結果；exact 為 True 時 result 可直接沿用
+
+    近似文件：result 為舊文件的分析結果，fields 為需要重問的題號（空的表示可以整份沿用），
+    prompt_text 為只含差異條款與相關條款的文字
+    """
+
+    def __init__(self, source, similarity, result, exact=False, fields=(), prompt_text=None, changed=0):
+        self.source = source
+        self.similarity = similarity
+        self.result = result
+        self.exact = exact
+        self.fields = fields
+        self.prompt_text = prompt_text
+        self.changed = changed
+
+
+def diff_clauses(text, old_clauses):
+    """比較新文字與舊文件的條款，回傳 (新文字的條款, 新增條款的位置, 受影響的題號)
+
+    old_clauses 為舊文件每個條款的 [摘要, 欄位]；刪除的條款也會讓其欄位的題目需要重問。
+    不含任何欄位關鍵字的條款（例如簽章欄的公司名稱、賬號）無法判斷影響哪些題目，視為全部受影響
+    """
+    clauses = split_clauses(text)
+    digests = [clause_digest(c) for c in clauses]
+    old_digests = {digest for digest, _ in old_clauses}
+    new_digests = set(digests)
+    added = [i for i, d in enumerate(digests) if d not in old_digests]
+    changed_fields = [clause_fields(clauses[i]) for i in added]
+    changed_fields += [old_fields for digest, old_fields in old_clauses if digest not in new_digests]
+    if any(not fields for fields in changed_fields):
+        return clauses, added, list(ALL_QUESTIONS)
+    questions = sorted({q for fields in changed_fields for f in fields for q in FIELD_QUESTIONS[f]})
+    return clauses, added, questions
+
+
+def build_diff_text(clauses, added, questions, neighbors=NEIGHBORS):
+    """新增的條款加上與受影響題目相關的條款（各帶前後文），依原文順序輸出；太長時回傳 None"""
+    related = {f for f, qs in FIELD_QUESTIONS.items() if set(qs) & set(questions)}
+    selected = set()
+    for i, clause in enumerate(clauses):
+        if i in added or related & set(clause_fields(clause)):
+            selected.update(j for j in range(i - neighbors, i + neighbors + 1) if 0 <= j < len(clauses))
+    parts = []
+    previous = None
+    for j in sorted(selected):
+        if previous is not None and j != previous + 1:
+            parts.append("……")
+        parts.append(clauses[j])
+        previous = j
+    diff_text = "\n".join(parts)
+    return diff_text if len(diff_text) <= MAX_COMPACT_CHARS else None
+
+
+class SimilarityIndex:
+    """已分析文件的 MinHash 索引與分析結果；config 為分析設定，設定不同的結果不會互相沿用"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                config TEXT,
+                text_hash TEXT,
+                signature TEXT,
+                clauses TEXT,
+                result TEXT,
+                source TEXT,
+                created REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bands (
+                config TEXT,
+                band INTEGER,
+                bucket TEXT,
+                doc_id INTEGER
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_hash ON documents (config, text_hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (config, band, bucket)")
+        self.conn.commit()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.reused_questions = 0
+        self.misses = 0
+
+    @staticmethod
+    def config_key(config):
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def find(self, text, config):
+        """回傳最相似的已分析文件（Match），找不到或差異太大時回傳 None"""
+        config = self.config_key(config)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT source, result FROM documents WHERE config = ? AND text_hash = ? "
+                "ORDER BY created DESC LIMIT 1", (config, text_hash(text))).fetchone()
+            if row is not None:
+                self.exact_hits += 1
+        if row is not None:
+            return Match(row[0], 1.0, row[1], exact=True)
+
+        signature = minhash(text)
+        best = None
+        with self._lock:
+            candidates = set()
+            for band, bucket in enumerate(_band_keys(signature)):
+                candidates.update(doc_id for (doc_id,) in self.conn.execute(
+                    "SELECT doc_id FROM bands WHERE config = ? AND band = ? AND bucket = ?",
+                    (config, band, bucket)))
+            for doc_id in candidates:
+                source, stored, clauses, result = self.conn.execute(
+                    "SELECT source, signature, clauses, result FROM documents WHERE id = ?", (doc_id,)).fetchone()
+                similarity = estimate_similarity(signature, json.loads(stored))
+                if similarity >= self.threshold and (best is None or similarity > best[0]):
+                    best = (similarity, source, clauses, result)
+            if best is None:
+                self.misses += 1
+                return None
+
+        similarity, source, old_clauses, result = best
+        clauses, added, questions = diff_clauses(text, json.loads(old_clauses))
+        changed = len(added) / max(len(clauses), 1)
+        prompt_text = build_diff_text(clauses, added, questions) if questions else ""
+        with self._lock:
+            # 所有題目都要重問時沒有可沿用的答案，只看差異條款反而少了上下文，改為分析全文
+            if changed > MAX_CHANGED_RATIO or prompt_text is None or len(questions) == len(ALL_QUESTIONS):
+                self.misses += 1
+                return None
+            self.near_hits += 1
+            self.reused_questions += len(ALL_QUESTIONS) - len(questions)
+        return Match(source, similarity, result, fields=questions, prompt_text=prompt_text, changed=len(added))
+
+    def add(self, text, config, result, source=None):
+        """記下一份已分析文件的簽章、條款摘要與分析結果"""
+        config = self.config_key(config)
+        signature = minhash(text)
+        clauses = [[clause_digest(c), clause_fields(c)] for c in split_clauses(text)]
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO documents (config, text_hash, signature, clauses, result, source, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (config, text_hash(text), json.dumps(signature), json.dumps(clauses, ensure_ascii=False),
+                 result, source, time.time()))
+            self.conn.executemany(
+                "INSERT INTO bands VALUES (?, ?, ?, ?)",
+                [(config, band, bucket, cursor.lastrowid) for band, bucket in enumerate(_band_keys(signature))])
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            removed = self.conn.execute("DELETE FROM documents").rowcount
+            self.conn.execute("DELETE FROM bands")
+            self.conn.commit()
+        return removed
+
+    def print_summary(self):
+        print(f"♻️  相似文件：完全相同 {self.exact_hits} 份直接沿用結果，近似 {self.near_hits} 份"
+              f"共沿用 {self.reused_questions} 個欄位，{self.misses} 份無相似文件")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="檢視相似度索引，或比較兩份 TXT 的相似度")
+    parser.add_argument("--path", default=DEFAULT_INDEX_PATH, help="索引檔案路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="顯示索引中的文件數")
+    sub.add_parser("clear", help="刪除所有索引的文件")
+    compare = sub.add_parser("compare", help="比較兩份 TXT 的相似度與需要重問的題目")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.old, 'r', encoding='utf-8') as f:
+            old_text = f.read()
+        with open(args.new, 'r', encoding='utf-8') as f:
+            new_text = f.read()
+        print(f"估計相似度：{estimate_similarity(minhash(old_text), minhash(new_text)):.2f}")
+        old_clauses = [[clause_digest(c), clause_fields(c)] for c in split_clauses(old_text)]
+        clauses, added, questions = diff_clauses(new_text, old_clauses)
+        print(f"新增或修改的條款：{len(added)} / {len(clauses)}，需要重問的題目：{questions or '無'}")
+        for i in added:
+            print(f"  + {clauses[i]}")
+        sys.exit(0)
+
+    if not os.path.exists(args.path):
+        print(f"❌ 找不到索引檔案：{args.path}")
+        sys.exit(1)
+    index = SimilarityIndex(args.path)
+    if args.command == "stats":
+        count = index.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        print(f"索引檔案：{args.path}，共 {count} 份已分析文件")
+    elif args.command == "clear":
+        print(f"🧹 已刪除 {index.clear()} 份文件")
+    index.close()
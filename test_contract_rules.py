@@ -0,0 +1,63 @@
+# test_contract_rules.py
+# contract_rules 的回歸案例：python -m pytest test_contract_rules.py
+from contract_rules import (extract_fields, rule_amounts, rule_contract_type, rule_payment_method,
+                            CONFIDENCE_THRESHOLD)
+
+STANDARD_CONTRACT = """需方：华东精密机械有限公司
+付款方式：乙方开具增值税发票后付款30%，验收合格后30日内支付剩余货款，以电汇方式支付。
+合同总额（含税）：人民币113,000.00元，不含税金额100,000.00元，税额13,000.00元，税率13%。
+"""
+
+
+def test_invoice_payment_percentage_is_not_a_tax_rate():
+    # 「增值税发票后付款30%」是付款比例，不能當成 30% 的稅率
+    answer, confidence = extract_fields(STANDARD_CONTRACT)[2]
+    assert answer == "100,000.00元、13,000.00元、113,000.00元"
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+def test_invoice_phrase_without_explicit_rate_goes_to_model():
+    text = "合同总额（含税）：人民币113,000.00元。乙方开具增值税发票后付款30%。"
+    answer, confidence = rule_amounts(text)
+    assert answer is None
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+def test_explicit_non_standard_rate_is_flagged():
+    text = "合同总额（含税）：人民币106,000.00元，增值税税率为6%。"
+    answer, confidence = rule_amounts(text)
+    assert "税率为6%" in answer
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+def test_conflicting_rates_go_to_model():
+    text = "设备部分税率13%，服务部分税率6%，合同总额（含税）：人民币119,000.00元。"
+    answer, confidence = rule_amounts(text)
+    assert answer is None
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+def test_payment_term_deadline_is_closed_contract():
+    answer, confidence = extract_fields(STANDARD_CONTRACT)[6]
+    assert answer == "闭口合同"
+    assert confidence >= CONFIDENCE_THRESHOLD
+
+
+def test_penalty_deadline_is_not_closed_contract():
+    # 違約金、保證金的付款期限不是合同款的回款時間
+    text = "违约方应在10日内支付违约金。乙方应在5日内支付履约保证金。货款按实际订单另行结算。"
+    answer, confidence = rule_contract_type(text)
+    assert answer is None
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+def test_negated_acceptance_bill_is_not_a_payment_method():
+    text = "付款方式：不接受承兑汇票，以电汇方式支付货款。"
+    assert rule_payment_method(text)[0] == "电汇"
+    text = "除银行承兑汇票外，需方以电汇方式付款。"
+    assert rule_payment_method(text)[0] == "电汇"
+
+
+def test_both_payment_methods_are_listed():
+    text = "付款方式：电汇或银行承兑汇票支付。"
+    assert rule_payment_method(text)[0] == "电汇、承兑汇票"
@@ -0,0 +1,45 @@
+# test_similarity_index.py
+# similarity_index 的回歸案例：python -m pytest test_similarity_index.py
+from similarity_index import SimilarityIndex, diff_clauses, clause_digest, clause_fields, ALL_QUESTIONS
+from clause_filter import split_clauses
+
+CONFIG = {"template": "test"}
+CONTRACT = """需方：华东精密机械有限公司
+合同总额（含税）：人民币113,000.00元，税率13%。
+付款方式：验收合格后30日内以电汇方式支付全部货款。
+需方开户银行：中国工商银行上海分行，账号：1001 2345 6789。
+乙方开具增值税专用发票后发货。
+本合同一式两份，双方各执一份，自双方签字盖章之日起生效。
+未尽事宜由双方友好协商解决。
+本合同适用中华人民共和国法律。
+签章：华东精密机械有限公司（盖章）
+"""
+SIGNATURE_CHANGED = CONTRACT.replace("签章：华东精密机械有限公司", "签章：华南重工设备有限公司")
+
+
+def old_clauses(text):
+    return [[clause_digest(c), clause_fields(c)] for c in split_clauses(text)]
+
+
+def test_changed_clause_without_keywords_affects_every_question():
+    # 簽章欄只有公司名稱、沒有欄位關鍵字，不能因此沿用舊文件的需方與賬戶
+    _, added, questions = diff_clauses(SIGNATURE_CHANGED, old_clauses(CONTRACT))
+    assert len(added) == 1
+    assert questions == list(ALL_QUESTIONS)
+
+
+def test_near_duplicate_with_changed_signature_is_analyzed_in_full(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "index.sqlite"), threshold=0.5)
+    try:
+        index.add(CONTRACT, CONFIG, "1. 需方：华东精密机械有限公司", source="old.txt")
+        assert index.find(SIGNATURE_CHANGED, CONFIG) is None
+        assert index.find(CONTRACT, CONFIG).exact
+    finally:
+        index.close()
+
+
+def test_changed_keyword_clause_only_reasks_its_questions():
+    changed = CONTRACT.replace("乙方开具增值税专用发票后发货", "乙方开具增值税普通发票后发货")
+    _, added, questions = diff_clauses(changed, old_clauses(CONTRACT))
+    assert len(added) == 1
+    assert questions == [2, 5]
@@ -0,0 +1,304 @@
+# watch_folder.py
+# 常駐模式：不開資料夾對話框，持續監看輸入資料夾（Linux 為 inotify、macOS 為 FSEvents，
+# 沒有安裝 watchdog 或網路磁碟不支援時改為定期掃描），新的 PDF / Word 檔寫入完成後數秒內
+# 依序完成文字擷取、Gemini 分析與疑慮紀錄，並與批次模式一樣更新疑慮文件報告（含有圖片的 Word 檔、
+# 非 Word 檔案）；以工作佇列記錄進度，重新啟動不會重複處理
+import os
+import sys
+import time
+import signal
+import threading
+
+from job_queue import JobQueue, DEFAULT_QUEUE_PATH, SUPPORTED_EXTENSIONS
+
+# 檔案大小與修改時間連續 DEBOUNCE_SECONDS 秒沒有變化，才視為已寫入完成
+DEBOUNCE_SECONDS = 2.0
+POLL_SECONDS = 2.0
+# 疑慮紀錄有新增時，最多每隔 REPORT_SECONDS 秒重新匯出一次 Excel 報告
+REPORT_SECONDS = 5.0
+# 複製中或編輯中的暫存檔
+IGNORED_PREFIXES = ("~$", ".")
+IGNORED_SUFFIXES = (".part", ".crdownload", ".tmp", ".download")
+
+
+def is_temporary(path):
+    name = os.path.basename(path)
+    return name.startswith(IGNORED_PREFIXES) or name.lower().endswith(IGNORED_SUFFIXES)
+
+
+def is_candidate(path):
+    """需要擷取與分析的檔案（PDF / Word）"""
+    return path.lower().endswith(SUPPORTED_EXTENSIONS) and not is_temporary(path)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+class Debouncer:
+    """記錄有變動的檔案，大小與修改時間穩定一段時間後才交出去；暫存檔不記錄"""
+
+    def __init__(self, quiet_seconds=DEBOUNCE_SECONDS):
+        self.quiet_seconds = quiet_seconds
+        self._lock = threading.Lock()
+        self._seen = {}  # 路徑 → ((大小, 修改時間), 最後一次變動的時間)
+
+    def touch(self, path):
+        if not is_temporary(path):
+            with self._lock:
+                self._seen.setdefault(os.path.abspath(path), (None, time.monotonic()))
+
+    def ready(self):
+        """回傳已穩定的檔案路徑；消失的檔案直接丟棄"""
+        now = time.monotonic()
+        stable = []
+        with self._lock:
+            for path, (previous, changed) in list(self._seen.items()):
+                current = _stat(path)
+                if current is None:
+                    del self._seen[path]
+                elif current != previous:
+                    self._seen[path] = (current, now)
+                elif now - changed >= self.quiet_seconds and (current[0] > 0 or not is_candidate(path)):
+                    del self._seen[path]
+                    stable.append(path)
+        return stable
+
+
+class PollingWatcher:
+    """定期掃描資料夾，新增或修改時間、大小改變的檔案（暫存檔除外）交給 on_change"""
+
+    def __init__(self, folder, on_change, interval=POLL_SECONDS):
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._snapshot = {}
+        self._thread = threading.Thread(target=self._run, name="folder-poller", daemon=True)
+
+    def _scan(self):
+        snapshot = {}
+        for root, _, filenames in os.walk(self.folder):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if not is_temporary(path):
+                    snapshot[path] = _stat(path)
+        for path, state in snapshot.items():
+            if self._snapshot.get(path) != state:
+                self.on_change(path)
+        self._snapshot = snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._scan()
+
+    def start(self):
+        self._scan()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def create_watcher(folder, on_change, polling=False):
+    """有安裝 watchdog 時使用系統的檔案事件通知，否則（或 polling=True 時）定期掃描"""
+    if not polling:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            print("ℹ️  未安裝 watchdog，改為每隔幾秒掃描資料夾")
+        else:
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    if event.is_directory:
+                        return
+                    # 移動 / 改名事件以新路徑為準（例如下載完成後從 .part 改名）
+                    on_change(getattr(event, "dest_path", "") or event.src_path)
+
+            observer = Observer()
+            observer.schedule(Handler(), folder, recursive=True)
+            return observer
+    return PollingWatcher(folder, on_change)
+
+
+class WatchDaemon:
+    """監看資料夾並以工作佇列處理新檔案；stop() 後處理中的檔案完成才結束"""
+
+    def __init__(self, folder, queue, ctx, threads=2, debounce=DEBOUNCE_SECONDS, polling=False,
+                 report_path=None, report_interval=REPORT_SECONDS):
+        self.folder = os.path.abspath(folder)
+        self.queue = queue
+        self.ctx = ctx
+        self.threads = threads
+        self.report_path = report_path
+        self.report_interval = report_interval
+        self._exported = None  # 上次匯出時疑慮紀錄的筆數
+        self._exported_at = 0.0
+        self.debouncer = Debouncer(debounce)
+        self.watcher = create_watcher(self.folder, self.debouncer.touch, polling=polling)
+        self.stop_event = threading.Event()
+        # 處理中又被修改的檔案：此時不能重新加入佇列，等這次處理結束後再檢查一次
+        self._recheck = set()
+        # 疑慮文件報告的內容：路徑 → 疑慮原因，與批次模式（analyze_folder）的判斷相同
+        self.problems = {}
+        self._problems_changed = False
+        self._problems_exported_at = 0.0
+
+    def check_file(self, path):
+        """更新一個檔案在疑慮文件報告中的疑慮原因（含有圖片的 Word 檔、非 Word / PDF / TXT 檔案）"""
+        from RPA統合程式測試 import problem_reason
+        reason = problem_reason(path, self.ctx.manifest)
+        if self.problems.get(path) == reason:
+            return
+        if reason is None:
+            del self.problems[path]
+        else:
+            self.problems[path] = reason
+            label = "Word檔含有圖片" if reason == "含有圖片" else "非Word檔案格式"
+            print(f"⚠️  {os.path.basename(path)} - {label}")
+        self._problems_changed = True
+
+    def _submit(self, path):
+        # 新檔案，或大小 / 修改時間與上次處理時不同的檔案才會加入
+        if self.queue.enqueue([path]):
+            print(f"📥 加入佇列：{os.path.relpath(path, self.folder)}")
+            return True
+        return False
+
+    def submit_ready(self):
+        stable = self.debouncer.ready()
+        for path in stable:
+            self.check_file(path)
+        ready = [path for path in stable if is_candidate(path) and not self._submit(path)]
+        if not ready and not self._recheck:
+            return
+        active = {path for path, *_ in self.queue.active()}
+        self._recheck.update(path for path in ready if path in active)
+        for path in list(self._recheck - active):
+            self._recheck.discard(path)
+            self._submit(path)
+
+    def export_problems(self, force=False):
+        """疑慮文件有變動、且距離上次匯出超過 report_interval 秒時，
+        以批次模式的 generate_excel_report 重新產生疑慮文件報告"""
+        for path in [path for path in self.problems if not os.path.exists(path)]:
+            # 已刪除的檔案不再列入報告
+            del self.problems[path]
+            self._problems_changed = True
+        if not self._problems_changed:
+            return
+        if not force and time.monotonic() - self._problems_exported_at < self.report_interval:
+            return
+        from RPA統合程式測試 import generate_excel_report
+        image_files = sorted(path for path, reason in self.problems.items() if reason == "含有圖片")
+        non_word_files = sorted(path for path, reason in self.problems.items() if reason != "含有圖片")
+        try:
+            generate_excel_report(image_files, non_word_files)
+        except OSError as e:
+            print(f"⚠️  無法更新疑慮文件報告：{e}")
+            return
+        finally:
+            self._problems_exported_at = time.monotonic()
+        self._problems_changed = False
+
+    def export_report(self, force=False):
+        """疑慮紀錄有新增、且距離上次匯出超過 report_interval 秒時重新匯出 Excel 報告
+
+        export_excel 先寫到暫存檔再取代，開啟中的報告不會讀到寫一半的檔案；報告被 Excel 鎖住時下次再試
+        """
+        if self.report_path is None or self.ctx.store is None:
+            return
+        count = self.ctx.store.count()
+        if not force and (count == self._exported or time.monotonic() - self._exported_at < self.report_interval):
+            return
+        try:
+            rows = self.ctx.store.export_excel(self.report_path)
+        except OSError as e:
+            print(f"⚠️  無法更新報告 {self.report_path}：{e}")
+            return
+        finally:
+            self._exported_at = time.monotonic()
+        self._exported = count
+        print(f"📊 已匯出 {rows} 筆疑慮紀錄到 {self.report_path}")
+
+    def run(self):
+        from process_all import run_queue_worker
+
+        print(f"👀 監看資料夾：{self.folder}（Ctrl+C 或 SIGTERM 停止）")
+        # 啟動時先把資料夾中既有的檔案交給去抖動；已處理過且沒有修改的檔案不會再加入佇列
+        for root, _, filenames in os.walk(self.folder):
+            for filename in filenames:
+                self.debouncer.touch(os.path.join(root, filename))
+        self.watcher.start()
+        worker = threading.Thread(
+            target=run_queue_worker, name="watch-worker",
+            kwargs=dict(queue=self.queue, ctx=self.ctx, threads=self.threads, exit_when_empty=False,
+                        poll_seconds=0.5, stop=self.stop_event))
+        worker.start()
+        try:
+            while not self.stop_event.wait(0.5):
+                self.submit_ready()
+                self.export_problems()
+                self.export_report()
+        finally:
+            self.stop_event.set()
+            self.watcher.stop()
+            print("⏳ 等待處理中的檔案完成...")
+            worker.join()
+            self.export_problems(force=True)
+            self.export_report(force=True)
+        print("✅ 已停止監看")
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+
+if __name__ == '__main__':
+    import argparse
+    from ask_gemini import require_api_key
+    from process_all import BatchContext
+    from rate_limiter import RateLimiter, DEFAULT_RPM, DEFAULT_TPM
+    from extract_cache import ExtractCache
+    from response_cache import ResponseCache
+    from run_manifest import RunManifest
+    from findings_store import FindingsStore, REPORT_PATH
+
+    parser = argparse.ArgumentParser(description="常駐監看資料夾，自動處理新加入的 PDF / Word 合約")
+    parser.add_argument("folder", help="要監看的輸入資料夾")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="工作佇列檔案路徑")
+    parser.add_argument("--threads", type=int, default=2, help="同時處理的檔案數")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS,
+                        help="檔案多少秒沒有變化才視為寫入完成")
+    parser.add_argument("--polling", action="store_true", help="不使用檔案事件通知，定期掃描資料夾")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="每分鐘請求數上限")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="每分鐘 token 數上限")
+    parser.add_argument("--prefilter", action="store_true", help="只把相關條款送給 Gemini")
+    parser.add_argument("--rules", action="store_true", help="先以本機規則解析欄位")
+    parser.add_argument("--report-interval", type=float, default=REPORT_SECONDS,
+                        help="疑慮紀錄有新增時，最多每隔幾秒重新匯出 Excel 報告")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ 找不到資料夾：{args.folder}")
+        sys.exit(1)
+    require_api_key()
+
+    ctx = BatchContext(limiter=RateLimiter(rpm=args.rpm, tpm=args.tpm), cache=ExtractCache(),
+                       response_cache=ResponseCache(), store=FindingsStore(), manifest=RunManifest(),
+                       prefilter=args.prefilter, rules=args.rules)
+    queue = JobQueue(args.queue)
+    daemon = WatchDaemon(args.folder, queue, ctx, threads=args.threads, debounce=args.debounce,
+                         polling=args.polling, report_path=REPORT_PATH, report_interval=args.report_interval)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run()
+    finally:
+        for resource in (ctx.cache, ctx.response_cache, ctx.store, ctx.manifest, queue):
+            resource.close()